@@ -0,0 +1,154 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from flask import Blueprint, abort, current_app, request
+from models import db, Venue, Artist
+import geo
+import queries
+import scheduling
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+# /api/v1 exposes venues, artists and shows from the same statements as
+# the HTML views. ?fields= selects columns at the SQL level, lists are
+# keyset-paginated through ?cursor=, and rows go straight from Row to
+# JSON (orjson when installed) with gzip for larger bodies.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+RESOURCES = {
+    'venues': (Venue, queries.VENUE_COLUMNS),
+    'artists': (Artist, queries.ARTIST_COLUMNS),
+}
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'),
+                      default=lambda value: value.isoformat()).encode()
+
+
+def json_response(payload, status=200):
+    body = dumps(payload)
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if (len(body) >= current_app.config['API_GZIP_MIN_SIZE'] and
+            'gzip' in request.accept_encodings):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return json_response({'error': error.description}, error.code)
+
+
+def parse_fields(fields, available, required):
+    """Columns named in a ?fields= value, always including the required
+    ones; raises ValueError for unknown names."""
+    names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+    names = list(required) + [name for name in names if name not in required]
+    return [available[name] for name in names]
+
+
+def clamp_limit(limit, config):
+    if limit is None:
+        limit = config['API_PAGE_SIZE']
+    return min(max(limit, 1), config['API_MAX_PAGE_SIZE'])
+
+
+def selected_columns(available, required):
+    try:
+        return parse_fields(request.args.get('fields'), available, required)
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def page_limit():
+    return clamp_limit(request.args.get('limit', type=int), current_app.config)
+
+
+@api.route('/<any(venues, artists):resource>')
+def list_entities(resource):
+    model, available = RESOURCES[resource]
+    limit = page_limit()
+    after_id = request.args.get('cursor', type=int)
+    stmt = queries.entity_page(model, selected_columns(available, ('id',)), after_id, limit + 1)
+    rows = [row._asdict() for row in db.session.execute(stmt)]
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    return json_response({'data': rows[:limit], 'next_cursor': next_cursor})
+
+
+@api.route('/<any(venues, artists):resource>/<int:entity_id>')
+def get_entity(resource, entity_id):
+    model, available = RESOURCES[resource]
+    stmt = queries.entity(model, selected_columns(available, ('id',)), entity_id)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        abort(404, '{} {} not found'.format(resource[:-1].capitalize(), entity_id))
+    return json_response({'data': row._asdict()})
+
+
+@api.route('/shows')
+def list_shows():
+    limit = page_limit()
+    try:
+        cursor = request.args.get('cursor')
+        cursor = queries.parse_show_cursor(cursor) if cursor else None
+    except ValueError:
+        abort(400, 'Invalid cursor')
+    stmt = queries.shows_page(
+        selected_columns(queries.SHOW_COLUMNS, ('id', 'start_time')), cursor, limit + 1,
+        venue_id=request.args.get('venue_id', type=int),
+        artist_id=request.args.get('artist_id', type=int))
+    rows = db.session.execute(stmt).all()
+    next_cursor = queries.show_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return json_response({'data': [row._asdict() for row in rows[:limit]],
+                          'next_cursor': next_cursor})
+
+
+@api.route('/venues/<int:venue_id>/free-slots')
+def venue_free_slots(venue_id):
+    """Unbooked ranges between ?start= and ?end= (ISO 8601, at most a year
+    apart) lasting at least ?min_minutes=."""
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        abort(400, 'start and end must be ISO 8601 datetimes')
+    if not start < end <= start + timedelta(days=366):
+        abort(400, 'end must be after start and at most a year later')
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        abort(404, 'Venue {} not found'.format(venue_id))
+    slots = scheduling.free_slots(venue_id, start, end, request.args.get('min_minutes', 0, type=int))
+    return json_response({'data': [{'start': slot_start, 'end': slot_end}
+                                   for slot_start, slot_end in slots]})
+
+
+@api.route('/venues/near')
+def venues_near():
+    """Venues within ?miles= of ?lat=&lng=, nearest first, with their next
+    shows."""
+    try:
+        latitude, longitude, miles = geo.parse_near(request.args, current_app.config)
+    except ValueError as e:
+        abort(400, str(e))
+    limit = clamp_limit(request.args.get('limit', current_app.config['NEAR_LIMIT'], type=int),
+                        current_app.config)
+    return json_response({'data': geo.venues_near(latitude, longitude, miles, limit)})
+
+
+def init_app(app):
+    app.register_blueprint(api)
@@ -2,111 +2,203 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
+import importlib
 import logging
-import datetime
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from datetime import datetime
+from functools import cached_property
+from itertools import groupby
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
+import click
+from flask import Flask, current_app, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import noload, selectinload
+from forms import VenueForm, ArtistForm, ShowForm
 from models import db, Venue, Show, Artist
+import api
+import assets
+import cache
+import conditional
+import counters
+import database
+import deletes
+import facets
+import feed
+import formatting
+import geo
+import instrumentation
+import jobs
+import queries
+import replicas
+import scheduling
+import search
+import templating
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Routes.
 #----------------------------------------------------------------------------#
+# Views below register themselves with @route; create_app() adds them to
+# each app under their function names, so url_for('show_venue') etc. work
+# as before.
+
+routes = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        routes.append((rule, view, options))
+        return view
+    return decorator
 
-app = Flask(__name__)
-app.config.from_object('config')
-moment = Moment(app)
-db.app = app
-db.init_app(app)
-migrate = Migrate(app, db)
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Query helpers.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+def search_results(model):
+    # One ranked, capped page of matches for the posted search form.
+    search_term = request.form.get('search_term', '')
+    offset = max(request.form.get('offset', 0, type=int), 0)
+    limit = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    total, ids = search.search(model, search_term, limit, offset)
+    total = min(total, current_app.config['SEARCH_MAX_MATCHES'])
+    rows = db.session.query(
+        model.id, model.name,
+        model.upcoming_show_count.label('num_upcoming_shows')
+    ).filter(model.id.in_(ids)).all() if ids else []
+    rows_by_id = {row.id: row for row in rows}
+    return {
+        "count": total,
+        "more": total == current_app.config['SEARCH_MAX_MATCHES'],
+        "search_term": search_term,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "previous_offset": max(offset - limit, 0) if offset else None,
+        "data": [{
+            "id": rows_by_id[id].id,
+            "name": rows_by_id[id].name,
+            "num_upcoming_shows": rows_by_id[id].num_upcoming_shows
+        } for id in ids if id in rows_by_id]
+    }
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+class ShowPage:
+    """Lazily turns show rows into tiles for one keyset page.
+
+    next_cursor is only known once the page has been iterated, which the
+    template does before rendering the pager.
+    """
+
+    def __init__(self, rows, page_size):
+        self.rows = rows
+        self.page_size = page_size
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, show in enumerate(self.rows):
+            if count == self.page_size:
+                self.next_cursor = queries.show_cursor(last)
+                break
+            last = show
+            yield {
+                "venue_id": show.venue_id,
+                "venue_name": show.venue_name,
+                "artist_id": show.artist_id,
+                "artist_name": show.artist_name,
+                "artist_image_link": show.artist_image_link,
+                "start_time": show.start_time
+            }
+
+
+def stream_template(template_name, **context):
+    # Flask 2.0 has no stream_template; this is the pattern from its docs.
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(5)
+    return Response(stream_with_context(stream))
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@route('/')
 def index():
-    return render_template('pages/home.html')
+    upcoming = feed.this_week(current_app.config['FEED_HOME_SIZE'])
+    return render_template('pages/home.html', upcoming=upcoming)
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@route('/venues')
+@conditional.conditional_page(lambda: conditional.listing_validator((Venue,)))
+@cache.cached_page(cache.listing_key('venues'))
 def venues():
-    venue_areas = Venue.query.distinct(Venue.city, Venue.state).all()
-    venues = Venue.query.all()
+    selection = facets.Selection(Venue, request.args)
+    rows = db.session.execute(queries.venue_areas(*selection.criteria())).all()
+
     data = []
-    for area in venue_areas:
+    for (city, state), area_venues in groupby(rows, key=lambda row: (row.city, row.state)):
         data.append({
-            "city": area.city,
-            "state": area.state,
+            "city": city,
+            "state": state,
             "venues": [{
                 "id": venue.id,
                 "name": venue.name,
-                "num_upcoming_shows": len([show for show in venue.shows if show.start_time > datetime.now()])
-            } for venue in venues if
-                venue.city == area.city and venue.state == area.state]
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in area_venues]
         })
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data, facets=facets.sidebar(selection))
 
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    results = Venue.query.filter(Venue.name.ilike(
-        '%{}%'.format(request.form['search_term']))).all()
-    response = {
-        "count": len(results),
-        "data": []
-    }
-    for venue in results:
-        response["data"].append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len([show for show in venue.shows if show.start_time > datetime.now()])
-        })
+@route('/venues/near')
+def venues_near():
+    config = current_app.config
+    near = None
+    miles = request.args.get('miles', config['NEAR_DEFAULT_MILES'], type=float)
+    if 'lat' in request.args:
+        try:
+            latitude, longitude, miles = geo.parse_near(request.args, config)
+        except ValueError as e:
+            flash(str(e))
+        else:
+            near = geo.venues_near(latitude, longitude, miles, config['NEAR_LIMIT'])
+    return render_template('pages/venues_near.html', venues=near, miles=miles,
+                           max_miles=config['NEAR_MAX_MILES'])
+
 
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+@route('/venues/search', methods=['POST'])
+@replicas.read_only
+def search_venues():
+    response = search_results(Venue)
+    return render_template('pages/search_venues.html', results=response, search_term=response['search_term'])
 
 
-@app.route('/venues/<int:venue_id>')
+@route('/venues/<int:venue_id>')
+@conditional.conditional_page(lambda venue_id: conditional.entity_validator(Venue, venue_id))
+@cache.cached_page(
+    lambda venue_id: 'venue:{}'.format(venue_id),
+    ttl=lambda venue_id: cache.seconds_until_next_show(Venue, venue_id))
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.options(
+        selectinload(Venue.shows).joinedload(Show.artist)
+    ).get_or_404(venue_id)
     past_shows = []
     upcoming_shows = []
 
     shows = venue.shows
     for show in shows:
+        if show.artist is None:
+            # The artist was deleted; the show awaits its purge.
+            continue
         show_info = {
             "artist_id": show.artist_id,
             "artist_name": show.artist.name,
             "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M")
+            "start_time": show.start_time
         }
         if show.start_time >= datetime.now():
             upcoming_shows.append(show_info)
@@ -139,13 +231,13 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@route('/venues/create', methods=['POST'])
 def create_venue_submission():
     form = VenueForm(request.form)
     try:
@@ -165,71 +257,77 @@ def create_venue_submission():
 
         db.session.add(venue)
         db.session.commit()
+        cache.invalidate_venue(venue.id, artist_ids=[])
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except ValueError as e:
-        if app.debug:
+        if current_app.debug:
             print(e)
         db.session.rollback()
         flash('An error has occurred. Venue ' +
               request.form['name'] + ' could not be added.')
-    finally:
-        db.session.close()
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>/delete', methods=['DELETE'])
+@route('/venues/<int:venue_id>/delete', methods=['DELETE'])
 def delete_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.get_or_404(venue_id)
+    name = venue.name
     try:
-        db.session.delete(venue)
+        # Past shows are purged by a background job; see deletes.py.
+        artist_ids = deletes.counterpart_ids(Venue, venue_id)
+        deletes.soft_delete(venue)
+        conditional.touch_counterparts(Venue, venue_id)
         db.session.commit()
-        flash('Venue ' + venue.name + ' was successfully deleted!')
-    except:
+    except SQLAlchemyError:
         db.session.rollback()
-        flash('Venue ' + venue.name + ' could not be deleted.')
-    finally:
-        db.session.close()
-        return jsonify({'success': True})
+        flash('Venue ' + name + ' could not be deleted.')
+        return jsonify({'success': False}), 500
+    cache.invalidate_venue(venue_id, artist_ids)
+    flash('Venue ' + name + ' was successfully deleted!')
+    return jsonify({'success': True})
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@route('/artists')
+@conditional.conditional_page(lambda: conditional.listing_validator((Artist,)))
+@cache.cached_page(cache.listing_key('artists'))
 def artists():
-    data = Artist.query.with_entities(Artist.id, Artist.name).all()
-    return render_template('pages/artists.html', artists=data)
+    selection = facets.Selection(Artist, request.args)
+    data = Artist.query.with_entities(Artist.id, Artist.name).filter(
+        *selection.criteria()).order_by(Artist.id).all()
+    return render_template('pages/artists.html', artists=data, facets=facets.sidebar(selection))
 
 
-@app.route('/artists/search', methods=['POST'])
+@route('/artists/search', methods=['POST'])
+@replicas.read_only
 def search_artists():
-    results = Artist.query.filter(Artist.name.ilike(
-        '%{}%'.format(request.form['search_term']))).all()
-    response = {
-        "count": len(results),
-        "data": []
-    }
-    for artist in results:
-        response["data"].append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len([show for show in artist.shows if show.start_time > datetime.now()])
-        })
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    response = search_results(Artist)
+    return render_template('pages/search_artists.html', results=response, search_term=response['search_term'])
 
 
-@app.route('/artists/<int:artist_id>')
+@route('/artists/<int:artist_id>')
+@conditional.conditional_page(lambda artist_id: conditional.entity_validator(Artist, artist_id))
+@cache.cached_page(
+    lambda artist_id: 'artist:{}'.format(artist_id),
+    ttl=lambda artist_id: cache.seconds_until_next_show(Artist, artist_id))
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.options(
+        selectinload(Artist.shows).joinedload(Show.venue)
+    ).get_or_404(artist_id)
     shows = artist.shows
     past_shows = []
     upcoming_shows = []
     for show in shows:
+        if show.venue is None:
+            # The venue was deleted; the show awaits its purge.
+            continue
         show_info = {
             "venue_id": show.venue.id,
             "venue_name": show.venue.name,
             "venue_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M")
+            "start_time": show.start_time
         }
         if show.start_time >= datetime.now():
             upcoming_shows.append(show_info)
@@ -260,13 +358,13 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@route('/artists/create', methods=['POST'])
 def create_artist_submission():
     form = ArtistForm(request.form)
     try:
@@ -285,149 +383,219 @@ def create_artist_submission():
 
         db.session.add(artist)
         db.session.commit()
+        cache.invalidate_artist(artist.id, venue_ids=[])
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except ValueError as e:
-        if app.debug:
+        if current_app.debug:
             print(e)
         db.session.rollback()
         flash('An error occurred. Artist ' +
               artist.name + ' could not be listed.')
-    finally:
-        db.session.close()
     return render_template('pages/home.html')
 
 
-@app.route('/artists/<artist_id>/delete', methods=['DELETE'])
+@route('/artists/<int:artist_id>/delete', methods=['DELETE'])
 def delete_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.get_or_404(artist_id)
+    name = artist.name
     try:
-        db.session.delete(artist)
+        # Past shows are purged by a background job; see deletes.py.
+        venue_ids = deletes.counterpart_ids(Artist, artist_id)
+        deletes.soft_delete(artist)
+        conditional.touch_counterparts(Artist, artist_id)
         db.session.commit()
-        flash('Artist ' + artist.name + ' was successfully deleted!')
-    except:
+    except SQLAlchemyError:
         db.session.rollback()
-        flash('Artist ' + artist.name + ' could not be deleted.')
-    finally:
-        db.session.close()
-        return jsonify({'success': True})
+        flash('Artist ' + name + ' could not be deleted.')
+        return jsonify({'success': False}), 500
+    cache.invalidate_artist(artist_id, venue_ids)
+    flash('Artist ' + name + ' was successfully deleted!')
+    return jsonify({'success': True})
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.options(noload(Artist.shows)).get(artist_id)
     form = ArtistForm(obj=artist)
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.options(noload(Artist.shows)).get(artist_id)
     form = ArtistForm(request.form)
 
     try:
         form.populate_obj(artist)
+        conditional.touch_counterparts(Artist, artist_id)
         db.session.commit()
+        cache.invalidate_artist(artist_id)
         flash("Artist {} is updated successfully".format(artist.name))
     except:
         db.session.rollback()
         flash("Artist {} isn't updated successfully".format(artist.name))
-    finally:
-        db.session.close()
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.options(noload(Venue.shows)).get(venue_id)
     form = VenueForm(obj=venue)
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.options(noload(Venue.shows)).get(venue_id)
     form = VenueForm(request.form)
 
     try:
         form.populate_obj(venue) #Per code review, I decided this was cleaner to use
+        conditional.touch_counterparts(Venue, venue_id)
         db.session.commit()
+        cache.invalidate_venue(venue_id)
         flash('Venue ' + venue.name + ' was successfully updated!')
     except:
         db.session.rollback()
         flash('An error occurred. Venue ' +
               venue.name + ' could not be updated.')
-    finally:
-        db.session.close()
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@route('/shows')
+@conditional.conditional_page(
+    lambda: conditional.listing_validator((Venue, Artist), uncounted=(Show,)))
+@cache.cached_page(cache.listing_key('shows'))
 def shows():
-    shows = Show.query.all()
-    data = []
-    for show in shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
-            })
-    return render_template('pages/shows.html', shows=data)
-
-
-
-@app.route('/shows/create')
+    page_size = current_app.config['SHOWS_PER_PAGE']
+    try:
+        cursor = request.args.get('cursor')
+        cursor = queries.parse_show_cursor(cursor) if cursor else None
+    except ValueError:
+        abort(400)
+    columns = [queries.SHOW_COLUMNS[column] for column in (
+        'id', 'start_time', 'venue_id', 'venue_name',
+        'artist_id', 'artist_name', 'artist_image_link')]
+    # One extra row tells us whether there is a next page.
+    stmt = queries.shows_page(columns, cursor, limit=page_size + 1)
+
+    if current_app.config['STREAM_TEMPLATES']:
+        rows = db.session.execute(
+            stmt.execution_options(stream_results=True)
+        ).yield_per(page_size // 4 or 1)
+        return stream_template('pages/shows.html', shows=ShowPage(rows, page_size))
+    page = ShowPage(db.session.execute(stmt).all(), page_size)
+    return render_template('pages/shows.html', shows=page)
+
+
+@route('/shows/upcoming')
+def upcoming_shows():
+    page_size = current_app.config['FEED_PAGE_SIZE']
+    try:
+        cursor = request.args.get('cursor')
+        cursor = queries.parse_show_cursor(cursor) if cursor else None
+    except ValueError:
+        abort(400)
+    state, city = request.args.get('state'), request.args.get('city')
+    genre = request.args.get('genre')
+    if (state is None) != (city is None) or (genre is not None and genre not in facets.GENRE_LABELS):
+        abort(404)
+    rows = db.session.execute(feed.feed_statement(
+        page_size + 1, cursor, state=state, city=city, genre=genre)).all()
+    next_cursor = feed.feed_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    if genre is not None:
+        heading = 'Upcoming {} shows'.format(facets.GENRE_LABELS[genre])
+    elif state is not None:
+        heading = 'Upcoming shows in {}, {}'.format(city, state)
+    else:
+        heading = 'Upcoming shows'
+    return render_template('pages/upcoming.html', shows=rows[:page_size], heading=heading,
+                           next_url=next_cursor and url_for(
+                               'upcoming_shows', **dict(request.args.to_dict(), cursor=next_cursor)))
+
+
+@route('/shows/create')
 def create_shows():
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@route('/shows/create', methods=['POST'])
 def create_show_submission():
     form = ShowForm()
-    
+    if not form.validate():
+        for field, errors in form.errors.items():
+            flash('{}: {}'.format(field, ', '.join(errors)))
+        return render_template('forms/new_show.html', form=form)
+
+    # The foreign keys still accept soft-deleted venues and artists.
+    if (Venue.query.filter_by(id=form.venue_id.data).first() is None or
+            Artist.query.filter_by(id=form.artist_id.data).first() is None):
+        flash('Unknown venue or artist. Show could not be listed.')
+        return render_template('forms/new_show.html', form=form)
+
+    clash = scheduling.conflicting_show(
+        form.venue_id.data, form.artist_id.data, form.start_time.data, form.duration_minutes.data)
+    if clash is not None:
+        flash('Show {} already books {} from {:%Y-%m-%d %H:%M} to {:%H:%M}.'.format(
+            clash.id, 'the venue' if clash.venue_id == form.venue_id.data else 'the artist',
+            clash.start_time, clash.end_time))
+        return render_template('forms/new_show.html', form=form)
+
     try:
         show = Show(
             artist_id = form.artist_id.data,
             venue_id = form.venue_id.data,
             start_time = form.start_time.data,
-            upcoming = (datetime.now() < form.start_time.data)
+            duration_minutes = form.duration_minutes.data
         )
         db.session.add(show)
         db.session.commit()
+        cache.invalidate_show(show.venue_id, show.artist_id)
         flash('Show was successfully listed!')
+    except IntegrityError as e:
+        db.session.rollback()
+        # 23P01: a concurrent booking won the exclusion constraint, or a
+        # past show of a deleted venue or artist still holds the slot
+        # until deletes.purge removes it.
+        if getattr(e.orig, 'pgcode', None) == '23P01':
+            flash('The venue or artist was just booked for that time. Show could not be listed.')
+        else:
+            flash('Unknown venue or artist. Show could not be listed.')
+        return render_template('forms/new_show.html', form=form)
     except ValueError as e:
-        if app.debug:
+        if current_app.debug:
             print(e)
         db.session.rollback()
         flash('An error occured. Show could not be listed.')
-    finally:
-        db.session.close()
     return redirect(url_for('index'))
 
 
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
+#----------------------------------------------------------------------------#
+# App Config.
+#----------------------------------------------------------------------------#
+
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
+def configure_logging(app):
+    if not app.config['ERROR_LOG']:
+        return
+    # delay=True: the file is only opened once something is logged.
+    file_handler = FileHandler(app.config['ERROR_LOG'], delay=True)
     file_handler.setFormatter(
         Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -435,7 +603,64 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+
+
+class LazyCommand(click.Command):
+    """A CLI command whose module is imported only when the command is run
+    or its --help is shown. Servers never import CLI-only modules."""
+
+    def __init__(self, import_name, name, short_help):
+        super().__init__(name, short_help=short_help)
+        self.import_name = import_name
+
+    @cached_property
+    def command(self):
+        module, attribute = self.import_name.split(':')
+        return getattr(importlib.import_module(module), attribute)
+
+    def get_params(self, ctx):
+        return self.command.get_params(ctx)
+
+    def format_help(self, ctx, formatter):
+        self.command.format_help(ctx, formatter)
+
+    def invoke(self, ctx):
+        return self.command.invoke(ctx)
+
+
+def create_app(config_object='config'):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    database.init_app(app)
+    replicas.init_app(app)
+    db.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Alembic is only needed by "flask db ..."; servers skip importing it.
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    api.init_app(app)
+    assets.init_app(app)
+    cache.init_app(app)
+    counters.init_app(app)
+    deletes.init_app(app)
+    feed.init_app(app)
+    formatting.init_app(app)
+    geo.init_app(app)
+    instrumentation.init_app(app)
+    jobs.init_app(app)
+    search.init_app(app)
+    templating.init_app(app)
+    app.cli.add_command(LazyCommand('importer:import_command', 'import', 'Import rows from a file.'))
+    app.cli.add_command(LazyCommand('seed:seed_command', 'seed', 'Insert synthetic data.'))
+
+    for rule, view, options in routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+
+    if not app.debug:
+        configure_logging(app)
+    return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -445,4 +670,4 @@ if not app.debug:
 # specify port manually:
 
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=4455)
+    create_app().run(host='127.0.0.1', port=4455)
@@ -0,0 +1,153 @@
+import gzip
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+import api
+import queries
+from app import create_app
+
+#----------------------------------------------------------------------------#
+# Async serving mode.
+#----------------------------------------------------------------------------#
+# An ASGI application for uvicorn:
+#
+#     uvicorn asgi:application --workers 4
+#
+# The read-only JSON API (GET/HEAD /api/v1/...) is served here from an
+# asyncpg AsyncEngine, so a process keeps as many requests in flight as
+# its pool has connections rather than one per thread. The statements come
+# from queries.py and the payloads match api.py. Every other request goes
+# to the Flask app through asgiref's WsgiToAsgi thread pool.
+
+url_map = Map([
+    Rule('/api/v1/<any(venues, artists):resource>', endpoint='list_entities'),
+    Rule('/api/v1/<any(venues, artists):resource>/<int:entity_id>', endpoint='get_entity'),
+    Rule('/api/v1/shows', endpoint='list_shows'),
+], strict_slashes=False)
+
+
+def async_url(url):
+    return url.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+
+def create_engine(config):
+    # Reads go to the first replica when there is one, like replicas.py.
+    url = (config['SQLALCHEMY_REPLICAS'] or [config['SQLALCHEMY_DATABASE_URI']])[0]
+    connect_args = {}
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        connect_args['server_settings'] = {
+            'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}
+    return create_async_engine(
+        async_url(url),
+        pool_size=config['ASYNC_DB_POOL_SIZE'],
+        max_overflow=config['ASYNC_DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+        pool_pre_ping=config['DB_POOL_PRE_PING'],
+        connect_args=connect_args,
+    )
+
+
+class Request:
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {key: values[0] for key, values in
+                     parse_qs(scope['query_string'].decode('latin-1')).items()}
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1')
+                        for key, value in scope['headers']}
+
+    def int_arg(self, name):
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return None
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.config = flask_app.config
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = create_engine(flask_app.config)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            try:
+                endpoint, view_args = url_map.bind('localhost').match(scope['path'], 'GET')
+            except HTTPException:
+                pass
+            else:
+                request = Request(scope)
+                try:
+                    status, payload = await getattr(self, endpoint)(request, **view_args)
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                await self.respond(send, request, status, payload)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def fetch(self, stmt):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(stmt)).all()
+
+    async def respond(self, send, request, status, payload):
+        body = api.dumps(payload)
+        headers = [(b'content-type', b'application/json'), (b'vary', b'Accept-Encoding')]
+        if (len(body) >= self.config['API_GZIP_MIN_SIZE'] and
+                'gzip' in request.headers.get('accept-encoding', '')):
+            body = gzip.compress(body, compresslevel=5)
+            headers.append((b'content-encoding', b'gzip'))
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body',
+                    'body': b'' if request.method == 'HEAD' else body})
+
+    async def list_entities(self, request, resource):
+        model, available = api.RESOURCES[resource]
+        limit = api.clamp_limit(request.int_arg('limit'), self.config)
+        columns = api.parse_fields(request.args.get('fields'), available, ('id',))
+        stmt = queries.entity_page(model, columns, request.int_arg('cursor'), limit + 1)
+        rows = [row._asdict() for row in await self.fetch(stmt)]
+        next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+        return 200, {'data': rows[:limit], 'next_cursor': next_cursor}
+
+    async def get_entity(self, request, resource, entity_id):
+        model, available = api.RESOURCES[resource]
+        columns = api.parse_fields(request.args.get('fields'), available, ('id',))
+        rows = await self.fetch(queries.entity(model, columns, entity_id))
+        if not rows:
+            return 404, {'error': '{} {} not found'.format(resource[:-1].capitalize(), entity_id)}
+        return 200, {'data': rows[0]._asdict()}
+
+    async def list_shows(self, request):
+        limit = api.clamp_limit(request.int_arg('limit'), self.config)
+        cursor = request.args.get('cursor')
+        try:
+            cursor = queries.parse_show_cursor(cursor) if cursor else None
+        except ValueError:
+            return 400, {'error': 'Invalid cursor'}
+        stmt = queries.shows_page(
+            api.parse_fields(request.args.get('fields'), queries.SHOW_COLUMNS, ('id', 'start_time')),
+            cursor, limit + 1,
+            venue_id=request.int_arg('venue_id'), artist_id=request.int_arg('artist_id'))
+        rows = await self.fetch(stmt)
+        next_cursor = queries.show_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return 200, {'data': [row._asdict() for row in rows[:limit]], 'next_cursor': next_cursor}
+
+
+application = AsyncAPI(create_app())
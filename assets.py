@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+# "flask assets build" concatenates each bundle below, minifies our CSS,
+# and writes static/dist/<bundle>.<hash>.<ext> with .gz (and, when the
+# brotli package is installed, .br) siblings plus a manifest.json. Templates
+# link bundles through asset_urls(); without a build they get the source
+# files. Hashed files are served with immutable far-future caching and the
+# best precompressed sibling the client accepts.
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Loaded in <head>, before the page renders.
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Deferred, after jQuery.
+    'main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def bundle_source(static_folder, name, files):
+    parts = []
+    for path in files:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as source_file:
+            source = source_file.read()
+        if name.endswith('.css') and not path.endswith('.min.css'):
+            source = minify_css(source)
+        parts.append(source)
+    # A JS file may end without a semicolon or inside a // comment.
+    return ('\n' if name.endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+
+def optional_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def build(static_folder):
+    """Write every bundle and the manifest; returns the manifest."""
+    brotli = optional_brotli()
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, files in BUNDLES.items():
+        body = bundle_source(static_folder, name, files)
+        stem, ext = os.path.splitext(name)
+        hashed = '{}.{}{}'.format(stem, hashlib.sha256(body).hexdigest()[:12], ext)
+        path = os.path.join(dist, hashed)
+        with open(path, 'wb') as out:
+            out.write(body)
+        with open(path + '.gz', 'wb') as out:
+            out.write(gzip.compress(body, compresslevel=9))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as out:
+                out.write(brotli.compress(body))
+        manifest[name] = hashed
+    with open(os.path.join(dist, MANIFEST), 'w') as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_urls(name):
+    """URLs to link for a bundle: its hashed file once built, otherwise the
+    source files."""
+    hashed = current_app.extensions['assets'].get(name)
+    if hashed is not None:
+        return [url_for('asset', filename=hashed)]
+    return [url_for('static', filename=path) for path in BUNDLES[name]]
+
+
+def send_asset(filename):
+    dist = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if (candidate in request.accept_encodings and
+                os.path.exists(os.path.join(dist, filename + suffix))):
+            encoding = candidate
+            filename += suffix
+            break
+    response = send_from_directory(dist, filename, mimetype=mimetype, max_age=31536000)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+assets_cli = AppGroup('assets', help='Build static asset bundles.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, hash and precompress static/css and static/js."""
+    manifest = build(current_app.static_folder)
+    for name, hashed in sorted(manifest.items()):
+        click.echo('{} -> {}/{}'.format(name, DIST, hashed))
+    if optional_brotli() is None:
+        click.echo('brotli is not installed; wrote .gz files only.')
+
+
+def init_app(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    # Same directory depth as static/css, so relative url()s keep working.
+    app.add_url_rule('{}/{}/<path:filename>'.format(app.static_url_path, DIST),
+                     endpoint='asset', view_func=send_asset)
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import partial, wraps
+from flask import current_app, g, make_response, request, session
+from werkzeug.utils import import_string
+from models import db, Show
+import formatting
+import replicas
+
+#----------------------------------------------------------------------------#
+# Rendered-page cache.
+#----------------------------------------------------------------------------#
+# GET pages are cached under "<route>:<id or query string>@<locale>" keys,
+# e.g. "venue:4@en" or "shows:cursor=...@en". Write handlers call the invalidate_*
+# helpers after a successful commit. Below conditional_page the page's ETag
+# is appended to the key ("venue:4@en@<etag>"), so a worker whose LRU missed
+# another worker's invalidation looks up a new key rather than serving the
+# old body under the new ETag. A shared backend only needs to implement
+# CacheBackend.
+#
+# A page rendered while a write invalidates it may hold the data from
+# before the write. Each invalidated prefix therefore has a generation,
+# bumped on every invalidation, and a page is only stored if the
+# generations of its key did not move while it rendered.
+
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    def __init__(self, **options):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class Generations:
+    """Invalidation counts per key prefix, for one process's renders."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def of(self, key):
+        # Invalidated prefixes end in ':' or '@' ("venues:", "venue:4@").
+        return tuple(self.counts.get(key[:end], 0)
+                     for end, char in enumerate(key, 1) if char in ':@')
+
+    def invalidate(self, cache, prefix):
+        with self.lock:
+            self.counts[prefix] += 1
+            cache.delete_prefix(prefix)
+
+    def store(self, cache, key, generation, value, ttl):
+        """Store value unless key was invalidated since generation."""
+        with self.lock:
+            if self.of(key) == generation:
+                cache.set(key, value, ttl)
+
+
+def init_app(app):
+    backend = import_string(app.config['CACHE_BACKEND'])
+    app.extensions['page_cache'] = backend(**app.config['CACHE_OPTIONS'])
+    app.extensions['page_generations'] = Generations()
+
+
+def get_cache():
+    return current_app.extensions['page_cache']
+
+
+def invalidate(prefix):
+    current_app.extensions['page_generations'].invalidate(get_cache(), prefix)
+
+
+def cached_page(key, ttl=None):
+    """Cache a view's 200 response body.
+
+    key(**view_args) builds the cache key, which also carries the ETag set
+    by an outer conditional_page; ttl(**view_args), if given, may shorten
+    CACHE_DEFAULT_TTL. Pages are neither served from nor stored in
+    the cache while the session has pending flash messages, since those
+    are rendered into the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if '_flashes' in session:
+                return view(**view_args)
+            cache_key = '{}@{}'.format(key(**view_args), formatting.current_locale())
+            if 'page_etag' in g:
+                cache_key += '@' + g.page_etag
+            body = get_cache().get(cache_key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='text/html')
+            generations = current_app.extensions['page_generations']
+            generation = generations.of(cache_key)
+            response = make_response(view(**view_args))
+            if response.status_code == 200 and not replicas.may_be_stale():
+                timeout = current_app.config['CACHE_DEFAULT_TTL']
+                if ttl is not None:
+                    timeout = min(timeout, ttl(**view_args))
+                store = partial(generations.store, get_cache(), cache_key, generation, ttl=timeout)
+                if timeout > 0 and response.is_streamed:
+                    response.response = store_when_sent(response.response, store)
+                elif timeout > 0:
+                    store(response.get_data())
+            return response
+        return wrapper
+    return decorator
+
+
+def store_when_sent(chunks, store):
+    """Pass a streamed body through, storing it once it was sent in full."""
+    body = []
+    for chunk in chunks:
+        body.append(chunk.encode() if isinstance(chunk, str) else chunk)
+        yield chunk
+    store(b''.join(body))
+
+
+def listing_key(route):
+    return lambda **view_args: '{}:{}'.format(route, request.query_string.decode())
+
+
+def seconds_until_next_show(model, entity_id):
+    # Detail pages split shows at "now", so they expire when the next
+    # upcoming show starts.
+    next_show_at = db.session.query(model.next_show_at).filter(
+        model.id == entity_id).scalar()
+    if next_show_at is None:
+        return current_app.config['CACHE_DEFAULT_TTL']
+    return max((next_show_at - datetime.now()).total_seconds(), 0)
+
+
+def invalidate_venue(venue_id, artist_ids=None):
+    """Drop a venue's page, its artists' pages and the listings showing it.
+
+    Deletes pass artist_ids collected before the shows are removed.
+    """
+    if artist_ids is None:
+        artist_ids = [artist_id for (artist_id,) in db.session.query(
+            Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+    invalidate('venue:{}@'.format(venue_id))
+    for artist_id in set(artist_ids):
+        invalidate('artist:{}@'.format(artist_id))
+    invalidate('venues:')
+    invalidate('shows:')
+
+
+def invalidate_artist(artist_id, venue_ids=None):
+    """Drop an artist's page, its venues' pages and the listings showing it."""
+    if venue_ids is None:
+        venue_ids = [venue_id for (venue_id,) in db.session.query(
+            Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
+    invalidate('artist:{}@'.format(artist_id))
+    for venue_id in set(venue_ids):
+        invalidate('venue:{}@'.format(venue_id))
+    invalidate('artists:')
+    invalidate('shows:')
+
+
+def invalidate_show(venue_id, artist_id):
+    invalidate('venue:{}@'.format(venue_id))
+    invalidate('artist:{}@'.format(artist_id))
+    invalidate('shows:')
+    invalidate('venues:')
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from sqlalchemy import func, select
+from models import db, Venue, Artist, Show, utc_now
+import formatting
+
+#----------------------------------------------------------------------------#
+# Conditional responses.
+#----------------------------------------------------------------------------#
+# Pages are validated by a "last modified" time derived from updated_at
+# columns, so If-None-Match / If-Modified-Since can be answered with a
+# 304 before the page query runs or the template renders. updated_at is
+# stored in UTC; start times and next_show_at are naive local times.
+
+COUNTERPARTS = {
+    Venue: (Artist, Show.venue_id, Show.artist_id),
+    Artist: (Venue, Show.artist_id, Show.venue_id),
+}
+
+
+def as_utc(value, local=False):
+    return value.astimezone(timezone.utc) if local else value.replace(tzinfo=timezone.utc)
+
+
+def entity_validator(model, entity_id):
+    row = db.session.query(model.updated_at, model.next_show_at).filter(
+        model.id == entity_id).first()
+    if row is None:
+        return None
+    last_modified = as_utc(row.updated_at)
+    # The upcoming/past split moves when the next show starts, even before
+    # the rollover job touches the row.
+    if row.next_show_at is not None and row.next_show_at <= datetime.now():
+        last_modified = max(last_modified, as_utc(row.next_show_at, local=True))
+    return last_modified, str(entity_id)
+
+
+def listing_validator(counted, uncounted=()):
+    # Row counts of the counted models go into the ETag to catch deletes,
+    # which leave max(updated_at) unchanged. Shows are only deleted along
+    # with their venue or artist, so they never need counting.
+    columns = [select(func.max(model.updated_at)).scalar_subquery()
+               for model in counted + uncounted]
+    columns += [select(func.count(model.id)).scalar_subquery() for model in counted]
+    row = db.session.query(*columns).one()
+    stamps = [as_utc(value) for value in row[:len(counted + uncounted)] if value is not None]
+    if not stamps:
+        return None
+    return max(stamps), '.'.join(str(count) for count in row[len(counted + uncounted):])
+
+
+def conditional_page(validator):
+    """Answer conditional GETs from validator(**view_args).
+
+    validator returns (last_modified, version) or None when the page can't
+    be validated; the ETag combines both and is left in g.page_etag for
+    cached_page. Pages rendered with flash messages get no validators, so
+    a flash is never replayed from a cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if '_flashes' in session:
+                return view(**view_args)
+            validated = validator(**view_args)
+            if validated is None:
+                return view(**view_args)
+            modified, version = validated
+            etag = '{}-{}-{}-{}'.format(request.endpoint, version, formatting.current_locale(),
+                                        modified.timestamp())
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (request.if_modified_since is not None and
+                                modified.replace(microsecond=0) <= request.if_modified_since)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                g.page_etag = etag
+                response = make_response(view(**view_args))
+            response.set_etag(etag)
+            response.last_modified = modified
+            return response
+        return wrapper
+    return decorator
+
+
+def touch_counterparts(model, entity_id):
+    """Bump updated_at on the venues/artists whose pages show this entity."""
+    counterpart, own_fk, other_fk = COUNTERPARTS[model]
+    db.session.execute(
+        counterpart.__table__.update().where(
+            counterpart.id.in_(select(other_fk).where(own_fk == entity_id))
+        ).values(updated_at=utc_now())
+    )
@@ -0,0 +1,142 @@
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, event, func, select, update
+from models import db, Venue, Artist, Show
+import jobs
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+# Venue and Artist carry upcoming_show_count, past_show_count and
+# next_show_at so listings read a column instead of aggregating shows.
+# Show.upcoming records which counter a show is in: it is set on insert,
+# and rollover_shows() (the shows.rollover job) moves started shows into
+# the past counters.
+
+OWNERS = ((Venue, Show.venue_id, 'venue_id'), (Artist, Show.artist_id, 'artist_id'))
+
+
+def shows_count(owner, show_fk, upcoming):
+    return select(func.count(Show.id)).where(
+        show_fk == owner.id, Show.upcoming.is_(upcoming)
+    ).scalar_subquery()
+
+
+def next_show_at(owner, show_fk, now):
+    return select(func.min(Show.start_time)).where(
+        show_fk == owner.id, Show.start_time > now
+    ).scalar_subquery()
+
+
+@event.listens_for(Show, 'before_insert')
+def classify_show(mapper, connection, show):
+    show.upcoming = show.start_time > datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+    for owner, show_fk, attr in OWNERS:
+        table = owner.__table__
+        if show.upcoming:
+            values = {
+                'upcoming_show_count': table.c.upcoming_show_count + 1,
+                'next_show_at': func.least(
+                    func.coalesce(table.c.next_show_at, show.start_time), show.start_time),
+            }
+        else:
+            values = {'past_show_count': table.c.past_show_count + 1}
+        connection.execute(
+            table.update().where(table.c.id == getattr(show, attr)).values(**values))
+
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+    for owner, show_fk, attr in OWNERS:
+        table = owner.__table__
+        if show.upcoming:
+            values = {
+                'upcoming_show_count': table.c.upcoming_show_count - 1,
+                'next_show_at': case(
+                    (table.c.next_show_at == show.start_time,
+                     next_show_at(owner, show_fk, datetime.now())),
+                    else_=table.c.next_show_at),
+            }
+        else:
+            values = {'past_show_count': table.c.past_show_count - 1}
+        connection.execute(
+            table.update().where(table.c.id == getattr(show, attr)).values(**values))
+
+
+@jobs.task('shows.rollover')
+def rollover_shows(now=None):
+    """Move shows that have started from the upcoming to the past counters.
+
+    Returns the number of shows moved.
+    """
+    now = now or datetime.now()
+    moved = db.session.execute(
+        update(Show.__table__).where(
+            Show.upcoming, Show.start_time <= now
+        ).values(upcoming=False).returning(Show.venue_id, Show.artist_id)
+    ).all()
+    for owner, show_fk, attr in OWNERS:
+        table = owner.__table__
+        counts = Counter(getattr(row, attr) for row in moved)
+        if not counts:
+            continue
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('owner_id')).values(
+                upcoming_show_count=table.c.upcoming_show_count - bindparam('moved'),
+                past_show_count=table.c.past_show_count + bindparam('moved'),
+                next_show_at=next_show_at(owner, show_fk, now),
+            ),
+            [{'owner_id': owner_id, 'moved': count} for owner_id, count in counts.items()]
+        )
+    db.session.commit()
+    return len(moved)
+
+
+def refresh_show_counts(venue_ids=None, artist_ids=None):
+    """Recompute counters from the shows table.
+
+    Bulk paths that bypass the ORM (imports, purges) call this for the ids
+    they touched; None recomputes every row.
+    """
+    now = datetime.now()
+    rollover_shows(now)
+    for (owner, show_fk, attr), ids in zip(OWNERS, (venue_ids, artist_ids)):
+        if ids is not None and not ids:
+            continue
+        table = owner.__table__
+        stmt = table.update().values(
+            upcoming_show_count=shows_count(owner, show_fk, True),
+            past_show_count=shows_count(owner, show_fk, False),
+            next_show_at=next_show_at(owner, show_fk, now),
+        )
+        if ids is not None:
+            stmt = stmt.where(table.c.id.in_(ids))
+        db.session.execute(stmt)
+    db.session.commit()
+
+
+shows_cli = AppGroup('shows', help='Maintain the cached show counters.')
+
+
+@shows_cli.command('rollover')
+def rollover_command():
+    """Move started shows into the past counters now; workers also run
+    this on JOB_SCHEDULE."""
+    click.echo('Moved {} shows to past.'.format(rollover_shows()))
+
+
+@shows_cli.command('recount')
+def recount_command():
+    """Recompute every venue and artist counter from scratch."""
+    refresh_show_counts()
+    click.echo('Show counters refreshed.')
+
+
+def init_app(app):
+    app.cli.add_command(shows_cli)
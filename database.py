@@ -0,0 +1,117 @@
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, QueuePool
+from models import db
+import instrumentation
+
+#----------------------------------------------------------------------------#
+# Engine configuration.
+#----------------------------------------------------------------------------#
+# Builds SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings in config.py and
+# exports pool saturation through /_debug/metrics.
+#
+# Session lifecycle: Flask-SQLAlchemy gives each request (or CLI command)
+# one scoped session and removes it at app-context teardown, which returns
+# its connection to the pool. Handlers commit or roll back but never close
+# the session themselves.
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.wait_seconds = 0.0
+        self.wait_count = 0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            with self.wait_lock:
+                self.wait_seconds += waited
+                self.wait_count += 1
+                self.wait_max = max(self.wait_max, waited)
+
+
+def engine_options(config):
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_POOL_MODE'] == 'null':
+        # PgBouncer in transaction mode owns the pooling, and it rejects
+        # startup options, so the timeout is set per transaction instead.
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+        })
+        if config['DB_STATEMENT_TIMEOUT_MS']:
+            options['connect_args'] = {
+                'options': '-c statement_timeout={}'.format(config['DB_STATEMENT_TIMEOUT_MS'])
+            }
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return options
+
+
+def pool_metrics(app):
+    def collect():
+        pools = {}
+        with app.app_context():
+            pools['default'] = db.get_engine(app).pool
+            for bind_key in app.config.get('SQLALCHEMY_BINDS') or {}:
+                pools[bind_key] = db.get_engine(app, bind=bind_key).pool
+        samples = {name: {} for name in (
+            'db_pool_size', 'db_pool_checked_out', 'db_pool_overflow',
+            'db_pool_wait_seconds_total', 'db_pool_waits_total', 'db_pool_wait_seconds_max')}
+        for engine_name, pool in pools.items():
+            if not isinstance(pool, QueuePool):
+                continue
+            labels = (('engine', engine_name),)
+            samples['db_pool_size'][labels] = pool.size()
+            samples['db_pool_checked_out'][labels] = pool.checkedout()
+            samples['db_pool_overflow'][labels] = max(pool.overflow(), 0)
+            if isinstance(pool, TimedQueuePool):
+                samples['db_pool_wait_seconds_total'][labels] = pool.wait_seconds
+                samples['db_pool_waits_total'][labels] = pool.wait_count
+                samples['db_pool_wait_seconds_max'][labels] = pool.wait_max
+        return [
+            ('db_pool_size', 'gauge', 'Configured pool size.', samples['db_pool_size']),
+            ('db_pool_checked_out', 'gauge', 'Connections in use.', samples['db_pool_checked_out']),
+            ('db_pool_overflow', 'gauge', 'Connections open beyond pool_size.', samples['db_pool_overflow']),
+            ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.',
+             samples['db_pool_wait_seconds_total']),
+            ('db_pool_waits_total', 'counter', 'Connection checkouts.', samples['db_pool_waits_total']),
+            ('db_pool_wait_seconds_max', 'gauge', 'Longest checkout wait.',
+             samples['db_pool_wait_seconds_max']),
+        ]
+    return collect
+
+
+# Registered once for every app; each transaction reads the settings of the
+# app it runs in.
+@event.listens_for(Session, 'after_begin')
+def _set_statement_timeout(session, transaction, connection):
+    if not has_app_context():
+        return
+    config = current_app.config
+    if config['DB_POOL_MODE'] == 'null' and config['DB_STATEMENT_TIMEOUT_MS']:
+        connection.exec_driver_sql('SET LOCAL statement_timeout = {:d}'.format(
+            config['DB_STATEMENT_TIMEOUT_MS']))
+
+
+def init_app(app):
+    """Call before db.init_app(app)."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    instrumentation.registry.add_collector(pool_metrics(app))
@@ -0,0 +1,135 @@
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, orm, select
+from sqlalchemy.sql import Select
+from models import db, Venue, Artist, Show, SoftDeleted, utc_now
+import counters
+import jobs
+
+#----------------------------------------------------------------------------#
+# Soft delete.
+#----------------------------------------------------------------------------#
+# Deleting a venue or artist sets deleted_at, deletes its unfinished shows
+# and queues a deletes.purge job for its past ones, so the request only
+# waits on the shows that can still clash with new bookings. Plain ORM
+# SELECTs leave soft-deleted rows out (including joins and relationship
+# loads) unless run with execution_options(include_deleted=True); the
+# shared statements in queries.py and geo.py, which asgi.py also runs on
+# asyncpg, and facets.py's counts filter deleted_at explicitly. The purge
+# deletes the shows in DELETE_PURGE_BATCH_SIZE batches, one transaction
+# each, then deletes the row itself, letting ON DELETE CASCADE take the
+# final batch, and recounts the counterparts' show counters. The
+# deletes.sweep job requeues purges that never finished.
+
+KINDS = {
+    'venue': (Venue, 'venue_id', 'artist_id'),
+    'artist': (Artist, 'artist_id', 'venue_id'),
+}
+KIND_OF = {model: kind for kind, (model, own_fk, other_fk) in KINDS.items()}
+
+
+@event.listens_for(orm.Session, 'do_orm_execute')
+def _hide_deleted(execute_state):
+    # The load flags only exist for plain ORM SELECTs; compound selects
+    # (facets.counts_statement()) and Core statements filter deleted_at
+    # themselves.
+    if not (execute_state.is_select and execute_state.is_orm_statement and
+            isinstance(execute_state.statement, Select)):
+        return
+    if (not execute_state.is_column_load and not execute_state.is_relationship_load and
+            not execute_state.execution_options.get('include_deleted', False)):
+        execute_state.statement = execute_state.statement.options(orm.with_loader_criteria(
+            SoftDeleted, lambda cls: cls.deleted_at.is_(None), include_aliases=True))
+
+
+def counterpart_ids(model, entity_id):
+    """Ids of the artists (for a venue) or venues (for an artist) it has
+    shows with."""
+    model, own_fk, other_fk = KINDS[KIND_OF[model]]
+    shows = Show.__table__
+    return [other_id for (other_id,) in db.session.execute(
+        select(shows.c[other_fk]).where(shows.c[own_fk] == entity_id).distinct())]
+
+
+def soft_delete(entity):
+    """Hide entity, delete its unfinished shows and queue the purge of it
+    and its past ones, in the caller's transaction."""
+    entity.deleted_at = utc_now()
+    kind = KIND_OF[type(entity)]
+    model, own_fk, other_fk = KINDS[kind]
+    # Through the ORM, so the counter events update the counterparts. The
+    # exclusion constraints would otherwise keep these slots booked until
+    # the purge.
+    for show in db.session.execute(select(Show).where(
+            getattr(Show, own_fk) == entity.id,
+            func.upper(Show.slot) > datetime.now())).scalars():
+        db.session.delete(show)
+    jobs.enqueue('deletes.purge', {'kind': kind, 'entity_id': entity.id},
+                 unique_key='purge:{}:{}'.format(kind, entity.id))
+
+
+@jobs.task('deletes.purge', timeout=3600)
+def purge(kind, entity_id):
+    model, own_fk, other_fk = KINDS[kind]
+    table, shows = model.__table__, Show.__table__
+    if db.session.execute(select(table.c.id).where(
+            table.c.id == entity_id, table.c.deleted_at.isnot(None))).first() is None:
+        return
+    batch_size = current_app.config['DELETE_PURGE_BATCH_SIZE']
+    total = db.session.execute(
+        select(func.count()).select_from(shows).where(shows.c[own_fk] == entity_id)).scalar()
+    others = set()
+    purged = 0
+    while total - purged > batch_size:
+        batch = select(shows.c.id).where(shows.c[own_fk] == entity_id).limit(batch_size)
+        rows = db.session.execute(
+            delete(shows).where(shows.c.id.in_(batch)).returning(shows.c[other_fk])).all()
+        if not rows:
+            break
+        others.update(other_id for (other_id,) in rows)
+        purged += len(rows)
+        jobs.report_progress(shows_purged=purged, shows_total=total)
+        db.session.commit()
+        current_app.logger.info('Purging %s %s: %s/%s shows', kind, entity_id, purged, total)
+    others.update(counterpart_ids(model, entity_id))
+    db.session.execute(delete(table).where(table.c.id == entity_id))
+    jobs.report_progress(shows_purged=total, shows_total=total)
+    db.session.commit()
+    # Core DELETEs bypass the ORM counter events.
+    counters.refresh_show_counts(**{other_fk + 's': others, own_fk + 's': set()})
+
+
+@jobs.task('deletes.sweep')
+def sweep():
+    """Queue purges for rows soft-deleted over an hour ago that are still
+    there, e.g. because their purge ran out of attempts."""
+    for kind, (model, own_fk, other_fk) in KINDS.items():
+        table = model.__table__
+        for (entity_id,) in db.session.execute(select(table.c.id).where(
+                table.c.deleted_at < utc_now() - jobs.seconds(3600))):
+            jobs.enqueue('deletes.purge', {'kind': kind, 'entity_id': entity_id},
+                         unique_key='purge:{}:{}'.format(kind, entity_id))
+
+
+deletes_cli = AppGroup('deletes', help='Inspect soft-deleted venues and artists.')
+
+
+@deletes_cli.command('status')
+def status_command():
+    """Soft-deleted rows and the shows each still has to purge."""
+    shows = Show.__table__
+    for kind, (model, own_fk, other_fk) in KINDS.items():
+        table = model.__table__
+        remaining = select(func.count()).select_from(shows).where(
+            shows.c[own_fk] == table.c.id).scalar_subquery()
+        for entity_id, name, deleted_at, count in db.session.execute(
+                select(table.c.id, table.c.name, table.c.deleted_at, remaining)
+                .where(table.c.deleted_at.isnot(None)).order_by(table.c.deleted_at)):
+            click.echo('{} {} ({}): deleted {:%Y-%m-%d %H:%M}, {} shows left'.format(
+                kind, entity_id, name, deleted_at, count))
+
+
+def init_app(app):
+    app.cli.add_command(deletes_cli)
@@ -0,0 +1,137 @@
+from flask import request, url_for
+from sqlalchemy import String, cast, func, literal_column, select, union_all
+from enums import Genre, State
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Faceted browsing.
+#----------------------------------------------------------------------------#
+# /venues and /artists filter on ?genre= (repeatable, all must match),
+# ?state=, ?city= and ?seeking=1. Genre filters use @> on the genres
+# arrays, served by their GIN indexes. counts() returns every facet's
+# counts for the filtered rows from one statement: a CTE of the matching
+# rows with one GROUP BY per facet, joined with UNION ALL.
+
+SEEKING = {
+    Venue: (Venue.seeking_talent, 'Seeking talent'),
+    Artist: (Artist.seeking_venue, 'Seeking a venue'),
+}
+
+# Cities can run into the thousands; the sidebar shows the biggest.
+MAX_CITIES = 25
+
+GENRE_LABELS = dict(Genre.choices())
+STATE_NAMES = {state.name for state in State}
+
+
+class Selection:
+    """The facet filters given in the query string, cleaned of unknown
+    values."""
+
+    def __init__(self, model, args):
+        self.model = model
+        self.genres = sorted({genre for genre in args.getlist('genre') if genre in GENRE_LABELS})
+        self.states = sorted({state for state in args.getlist('state') if state in STATE_NAMES})
+        self.city = args.get('city', '').strip() or None
+        self.seeking = args.get('seeking') == '1'
+
+    def criteria(self):
+        model = self.model
+        criteria = []
+        if self.genres:
+            # Cast to the column's varchar[] so the GIN index applies.
+            criteria.append(model.genres.op('@>')(cast(self.genres, model.genres.type)))
+        if self.states:
+            criteria.append(model.state.in_(self.states))
+        if self.city:
+            criteria.append(model.city == self.city)
+        if self.seeking:
+            criteria.append(SEEKING[model][0].is_(True))
+        return criteria
+
+    def args(self):
+        args = {'genre': self.genres, 'state': self.states}
+        if self.city:
+            args['city'] = self.city
+        if self.seeking:
+            args['seeking'] = '1'
+        return args
+
+    def toggled(self, facet, value):
+        """Query args with value added to or removed from facet."""
+        args = self.args()
+        if facet in ('genre', 'state'):
+            values = args[facet]
+            args[facet] = [v for v in values if v != value] if value in values else values + [value]
+        elif args.get(facet) == value:
+            del args[facet]
+        else:
+            args[facet] = value
+        return args
+
+    def __bool__(self):
+        return bool(self.genres or self.states or self.city or self.seeking)
+
+
+def counts_statement(model, criteria):
+    seeking_column = SEEKING[model][0]
+    # A UNION ALL isn't filtered by deletes.py, so soft-deleted rows are
+    # left out here.
+    filtered = select(
+        model.genres, model.state, model.city, seeking_column.label('seeking')
+    ).where(model.deleted_at.is_(None), *criteria).cte('filtered')
+    genre = select(func.unnest(filtered.c.genres).label('value')).subquery('genre')
+    facet = lambda name: literal_column("'{}'".format(name)).label('facet')
+    return union_all(
+        select(facet('genre'), genre.c.value, func.count()).group_by(genre.c.value),
+        select(facet('state'), filtered.c.state, func.count()).group_by(filtered.c.state),
+        select(facet('city'), filtered.c.city, func.count()).group_by(filtered.c.city),
+        select(facet('seeking'), cast(filtered.c.seeking, String), func.count())
+        .group_by(filtered.c.seeking),
+    )
+
+
+def counts(selection):
+    """{facet: {value: count}} over the rows matching the selection."""
+    result = {'genre': {}, 'state': {}, 'city': {}, 'seeking': {}}
+    for facet, value, count in db.session.execute(
+            counts_statement(selection.model, selection.criteria())):
+        result[facet][value] = count
+    return result
+
+
+def sidebar(selection):
+    """Facet groups for the template, each value with its count, whether
+    it is selected and the URL that toggles it."""
+    found = counts(selection)
+    link = lambda facet, value: url_for(request.endpoint, **selection.toggled(facet, value))
+
+    def group(name, label, values):
+        return {'name': name, 'label': label, 'values': [{
+            'value': value,
+            'label': value_label,
+            'count': count,
+            'selected': selected,
+            'url': link(name, value),
+        } for value, value_label, count, selected in values]}
+
+    cities = sorted(found['city'].items(), key=lambda item: (-item[1], item[0]))[:MAX_CITIES]
+    if selection.city and selection.city not in dict(cities):
+        cities.append((selection.city, found['city'].get(selection.city, 0)))
+    return {
+        'groups': [
+            group('genre', 'Genres', [
+                (genre, GENRE_LABELS[genre], found['genre'].get(genre, 0), genre in selection.genres)
+                for genre in GENRE_LABELS
+                if found['genre'].get(genre) or genre in selection.genres]),
+            group('state', 'States', [
+                (state, state, count, state in selection.states)
+                for state, count in sorted(found['state'].items())]),
+            group('city', 'Cities', [
+                (city, city, count, city == selection.city) for city, count in cities]),
+            group('seeking', SEEKING[selection.model][1], [
+                ('1', 'Yes', found['seeking'].get('true', 0), selection.seeking)]),
+        ],
+        'active': bool(selection),
+        'clear_url': url_for(request.endpoint),
+    }
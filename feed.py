@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from itertools import chain
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import ARRAY, Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy import event, orm, select, text, tuple_
+from models import Venue, Artist, Show, db
+import jobs
+
+#----------------------------------------------------------------------------#
+# Upcoming shows feed.
+#----------------------------------------------------------------------------#
+# feed_upcoming_shows is a materialized view of every upcoming show with
+# its venue and artist names, images and genres joined in (soft-deleted
+# venues and artists left out), and
+# feed_upcoming_show_genres has one row per (genre, show). Each feed is
+# one index range read: start_time for the homepage, (state, city,
+# start_time) per city and (genre, start_time) per genre. Both views are
+# refreshed CONCURRENTLY, so readers never block, by the feed.refresh job:
+# every JOB_SCHEDULE interval, and FEED_REFRESH_DELAY seconds after a
+# commit that wrote shows or edited venues or artists. Rows that started
+# since the last refresh are filtered out on read.
+#
+# The views live in their own MetaData so create_all and autogenerate
+# leave them to the migration that defines them.
+
+metadata = MetaData()
+
+upcoming_shows = Table(
+    'feed_upcoming_shows', metadata,
+    Column('show_id', Integer, primary_key=True),
+    Column('start_time', DateTime),
+    Column('duration_minutes', Integer),
+    Column('venue_id', Integer),
+    Column('venue_name', String),
+    Column('city', String),
+    Column('state', String),
+    Column('venue_image_link', String),
+    Column('artist_id', Integer),
+    Column('artist_name', String),
+    Column('artist_image_link', String),
+    Column('genres', ARRAY(String)),
+)
+
+upcoming_show_genres = Table(
+    'feed_upcoming_show_genres', metadata,
+    Column('genre', String),
+    Column('start_time', DateTime),
+    Column('show_id', Integer),
+)
+
+# In dependency order: the genres view reads feed_upcoming_shows.
+VIEWS = (upcoming_shows, upcoming_show_genres)
+
+
+@jobs.task('feed.refresh')
+def refresh(concurrently=True):
+    with db.engine.begin() as connection:
+        for view in VIEWS:
+            connection.execute(text('REFRESH MATERIALIZED VIEW {}{}'.format(
+                'CONCURRENTLY ' if concurrently else '', view.name)))
+
+
+def feed_statement(limit, cursor=None, state=None, city=None, genre=None, until=None):
+    """Upcoming shows in (start_time, show_id) order, keyset-paginated with
+    queries.parse_show_cursor() cursors."""
+    shows = upcoming_shows
+    if genre is not None:
+        genres = upcoming_show_genres
+        order = genres.c.start_time, genres.c.show_id
+        stmt = select(shows).select_from(genres).join(
+            shows, shows.c.show_id == genres.c.show_id).where(genres.c.genre == genre)
+    else:
+        order = shows.c.start_time, shows.c.show_id
+        stmt = select(shows)
+    stmt = stmt.where(order[0] >= datetime.now())
+    if state is not None:
+        stmt = stmt.where(shows.c.state == state, shows.c.city == city)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(*order) > cursor)
+    if until is not None:
+        stmt = stmt.where(order[0] < until)
+    return stmt.order_by(*order).limit(limit)
+
+
+def feed_cursor(row):
+    return '{}_{}'.format(row.start_time.isoformat(), row.show_id)
+
+
+def this_week(limit):
+    return db.session.execute(
+        feed_statement(limit, until=datetime.now() + timedelta(days=7))).all()
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _mark_stale(db_session, flush_context):
+    changed = chain(db_session.new, db_session.dirty, db_session.deleted)
+    edited = chain(db_session.dirty, db_session.deleted)
+    if (any(isinstance(instance, Show) for instance in changed) or
+            any(isinstance(instance, (Venue, Artist)) for instance in edited)):
+        db_session.info['feed_stale'] = True
+
+
+@event.listens_for(orm.Session, 'after_commit')
+def _schedule_refresh(db_session):
+    if not (db_session.info.pop('feed_stale', False) and has_app_context()):
+        return
+    delay = current_app.config['FEED_REFRESH_DELAY']
+    if delay is None:
+        return
+    # Writes within the delay share one queued refresh.
+    try:
+        with db.engine.begin() as connection:
+            jobs.enqueue('feed.refresh', delay=delay, unique_key='feed.refresh',
+                         connection=connection)
+    except Exception:
+        current_app.logger.exception('Could not queue a feed refresh')
+
+
+@event.listens_for(orm.Session, 'after_soft_rollback')
+def _forget_stale(db_session, previous_transaction):
+    db_session.info.pop('feed_stale', None)
+
+
+feed_cli = AppGroup('feed', help='Maintain the upcoming shows feed.')
+
+
+@feed_cli.command('refresh')
+@click.option('--blocking', is_flag=True,
+              help='Plain REFRESH, locking out readers; needed if the views are unpopulated.')
+def refresh_command(blocking):
+    """Rebuild the feed views; run this periodically."""
+    refresh(concurrently=not blocking)
+    click.echo('Feed refreshed.')
+
+
+def init_app(app):
+    app.cli.add_command(feed_cli)
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from flask import current_app, g, has_request_context, request
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+# The Jinja "datetime" filter. Views pass datetime objects; Babel patterns
+# are compiled once per (format, locale) and formatted strings are kept in
+# an LRU, since listings repeat the same handful of show times. The locale
+# is picked per request from Accept-Language among DATETIME_LOCALES.
+#
+#     python formatting.py     # per-tile cost, old path vs cached
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format, locale):
+    # Babel loads locale data on import; workers pay for it on first use.
+    import babel.dates
+    return babel.dates.parse_pattern(FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def format_cached(value, format, locale):
+    pattern, locale = compiled_pattern(format, locale)
+    # Babel reads naive datetimes as UTC; the patterns have no zone fields.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+
+
+def current_locale():
+    if has_request_context() and 'locale' in g:
+        return g.locale
+    return current_app.config['DATETIME_DEFAULT_LOCALE']
+
+
+def format_datetime(value, format='medium', locale=None):
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return format_cached(value, format, locale or current_locale())
+
+
+def init_app(app):
+    app.jinja_env.filters['datetime'] = format_datetime
+    locales = app.config['DATETIME_LOCALES']
+    if len(locales) < 2:
+        return
+
+    @app.before_request
+    def choose_locale():
+        g.locale = request.accept_languages.best_match(
+            locales, app.config['DATETIME_DEFAULT_LOCALE'])
+
+    @app.after_request
+    def vary_on_language(response):
+        if response.mimetype == 'text/html':
+            response.vary.add('Accept-Language')
+        return response
+
+
+def benchmark(tiles=5000, distinct=200):
+    import timeit
+    import babel.dates
+    import dateutil.parser
+    starts = [datetime(2026, 1 + i % 12, 1 + i % 28, 18 + i % 5) for i in range(distinct)]
+    values = [starts[i % distinct] for i in range(tiles)]
+
+    def old_path():
+        for value in values:
+            babel.dates.format_datetime(
+                dateutil.parser.parse(value.strftime("%m/%d/%Y, %H:%M:%S")), FORMATS['full'], locale='en')
+
+    def cold_path():
+        format_cached.cache_clear()
+        compiled_pattern.cache_clear()
+        for value in values:
+            format_cached(value, 'full', 'en')
+
+    def warm_path():
+        for value in values:
+            format_cached(value, 'full', 'en')
+
+    for name, run in (('strftime + parse + babel', old_path), ('cached, cold', cold_path),
+                      ('cached, warm', warm_path)):
+        seconds = min(timeit.repeat(run, number=1, repeat=5))
+        print('{:<26} {:>8.2f} us/tile'.format(name, seconds / tiles * 1e6))
+
+
+if __name__ == '__main__':
+    benchmark()
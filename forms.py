@@ -1,27 +1,38 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, ValidationError
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, ValidationError
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange
 import re
 from enums import Genre, State
 
 
+PHONE_PATTERN = re.compile('^\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
+
+# Built once rather than per validate(); flask import validates every row.
+GENRE_NAMES = frozenset(name for name, label in Genre.choices())
+STATE_NAMES = frozenset(name for name, label in State.choices())
+
+
 def is_valid_phone(number):
-    regex = re.compile('^\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})$')
-    return regex.match(number)
+    return PHONE_PATTERN.match(number)
 
 
 class ShowForm(FlaskForm):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        default=datetime.today
+    )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[DataRequired(), NumberRange(min=15, max=24 * 60)],
+        default=120
     )
 
 
@@ -70,10 +81,10 @@ class VenueForm(FlaskForm):
         elif not is_valid_phone(self.phone.data):
             self.phone.errors.append('Invalid Phone number')
             return False
-        elif not set(self.genres.data).issubset(dict(Genre.choices()).keys()):
+        elif not GENRE_NAMES.issuperset(self.genres.data):
             self.genres.errors.append('Invalid Genre selection')
             return False
-        elif not set(self.state.data).issubset(dict(State.choices()).keys()):
+        elif self.state.data not in STATE_NAMES:
             self.state.errors.append('Invalid State selection')
             return False
         else:
@@ -123,10 +134,10 @@ class ArtistForm(FlaskForm):
         elif not is_valid_phone(self.phone.data):
             self.phone.errors.append('Invalid Phone number')
             return False
-        elif not set(self.genres.data).issubset(dict(Genre.choices()).keys()):
+        elif not GENRE_NAMES.issuperset(self.genres.data):
             self.genres.errors.append('Invalid Genre selection')
             return False
-        elif not set(self.state.data).issubset(dict(State.choices()).keys()):
+        elif self.state.data not in STATE_NAMES:
             self.state.errors.append('Invalid State selection')
             return False
         else:
@@ -0,0 +1,304 @@
+import csv
+import heapq
+import math
+import re
+from itertools import groupby
+from operator import attrgetter
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from models import db, Venue
+import queries
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#----------------------------------------------------------------------------#
+# "flask geocode GAZETTEER" fills Venue.latitude/longitude from a local
+# gazetteer, matching on city and state (so venues get their city's
+# coordinates; no network is used). nearby() then finds venues within a
+# radius, nearest first:
+#
+#   'postgres'  earthdistance: earth_box() @> ll_to_earth() on the
+#               ix_Venue_earth GiST index, then exact earth_distance().
+#   'memory'    a KD-tree over points on the unit sphere, built on first
+#               use and kept current by mapper events. Bulk UPDATEs such
+#               as flask geocode are only seen after a restart.
+
+EARTH_RADIUS_MILES = 3958.8
+METERS_PER_MILE = 1609.344
+
+
+def unit_vector(latitude, longitude):
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+
+def chord_for_miles(miles):
+    # Straight-line distance through the sphere for a great-circle distance.
+    return 2 * math.sin(min(miles / EARTH_RADIUS_MILES, math.pi) / 2)
+
+
+def miles_for_chord(chord):
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(chord / 2, 1.0))
+
+
+class KDTree:
+    """3-d tree of (point, id) with inserts. A moved or deleted id leaves
+    its old node behind; queries skip nodes that don't match points[id]."""
+
+    def __init__(self, items=()):
+        self.points = dict(items)
+        self.root = self._build(list(self.points.items()), 0)
+
+    def _build(self, items, axis):
+        if not items:
+            return None
+        items.sort(key=lambda item: item[1][axis])
+        middle = len(items) // 2
+        entity_id, point = items[middle]
+        return [point, entity_id, axis,
+                self._build(items[:middle], (axis + 1) % 3),
+                self._build(items[middle + 1:], (axis + 1) % 3)]
+
+    def insert(self, entity_id, point):
+        self.points[entity_id] = point
+        if self.root is None:
+            self.root = [point, entity_id, 0, None, None]
+            return
+        node = self.root
+        while True:
+            axis = node[2]
+            branch = 3 if point[axis] < node[0][axis] else 4
+            if node[branch] is None:
+                node[branch] = [point, entity_id, (axis + 1) % 3, None, None]
+                return
+            node = node[branch]
+
+    def remove(self, entity_id):
+        self.points.pop(entity_id, None)
+
+    def nearest(self, point, limit, max_distance):
+        """Up to limit (distance, id) pairs within max_distance, nearest
+        first; distances are chord lengths."""
+        best = []  # max-heap of (-distance, id)
+
+        def visit(node):
+            if node is None:
+                return
+            node_point, entity_id, axis = node[0], node[1], node[2]
+            distance = math.dist(point, node_point)
+            if (distance <= max_distance and self.points.get(entity_id) == node_point):
+                if len(best) < limit:
+                    heapq.heappush(best, (-distance, entity_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, entity_id))
+            offset = point[axis] - node_point[axis]
+            near, far = (node[3], node[4]) if offset < 0 else (node[4], node[3])
+            visit(near)
+            bound = max_distance if len(best) < limit else min(max_distance, -best[0][0])
+            if abs(offset) <= bound:
+                visit(far)
+
+        visit(self.root)
+        return sorted((-distance, entity_id) for distance, entity_id in best)
+
+
+class PostgresGeo:
+    def nearby(self, latitude, longitude, miles, limit):
+        meters = miles * METERS_PER_MILE
+        origin = func.ll_to_earth(latitude, longitude)
+        location = func.ll_to_earth(Venue.latitude, Venue.longitude)
+        distance = func.earth_distance(origin, location)
+        rows = db.session.execute(
+            select(Venue.id, distance.label('meters'))
+            .where(func.earth_box(origin, meters).op('@>')(location), distance <= meters,
+                   Venue.deleted_at.is_(None))
+            .order_by(distance).limit(limit))
+        return [(venue_id, venue_meters / METERS_PER_MILE) for venue_id, venue_meters in rows]
+
+
+class MemoryGeo:
+    def __init__(self):
+        self.tree = None
+
+    def index(self):
+        if self.tree is None:
+            self.tree = KDTree(
+                (venue_id, unit_vector(latitude, longitude))
+                for venue_id, latitude, longitude in db.session.query(
+                    Venue.id, Venue.latitude, Venue.longitude
+                ).filter(Venue.latitude.isnot(None), Venue.longitude.isnot(None),
+                         Venue.deleted_at.is_(None)))
+        return self.tree
+
+    def update(self, venue):
+        if self.tree is None:
+            return
+        if venue.latitude is None or venue.longitude is None or venue.deleted_at is not None:
+            self.tree.remove(venue.id)
+        elif self.tree.points.get(venue.id) != unit_vector(venue.latitude, venue.longitude):
+            self.tree.insert(venue.id, unit_vector(venue.latitude, venue.longitude))
+
+    def remove(self, venue):
+        if self.tree is not None:
+            self.tree.remove(venue.id)
+
+    def nearby(self, latitude, longitude, miles, limit):
+        found = self.index().nearest(unit_vector(latitude, longitude), limit, chord_for_miles(miles))
+        return [(venue_id, miles_for_chord(chord)) for chord, venue_id in found]
+
+
+def memory_geo():
+    backend = current_app.extensions.get('geo') if has_app_context() else None
+    return backend if isinstance(backend, MemoryGeo) else None
+
+
+# Registered once for every app; each write goes to the tree of the app
+# that made it, if that app keeps one.
+
+@event.listens_for(Venue, 'after_insert')
+@event.listens_for(Venue, 'after_update')
+def _index_venue(mapper, connection, venue):
+    backend = memory_geo()
+    if backend is not None:
+        backend.update(venue)
+
+
+@event.listens_for(Venue, 'after_delete')
+def _unindex_venue(mapper, connection, venue):
+    backend = memory_geo()
+    if backend is not None:
+        backend.remove(venue)
+
+
+def forget():
+    """Rebuild the in-memory tree on next use; for Core writes, which the
+    mapper events never see."""
+    backend = memory_geo()
+    if backend is not None:
+        backend.tree = None
+
+
+BACKENDS = {
+    'postgres': PostgresGeo,
+    'memory': MemoryGeo,
+}
+
+
+def nearby(latitude, longitude, miles, limit):
+    """[(venue id, miles)] within miles of the point, nearest first."""
+    return current_app.extensions['geo'].nearby(latitude, longitude, miles, limit)
+
+
+def parse_near(args, config):
+    """(latitude, longitude, miles) from ?lat=&lng=&miles=; raises
+    ValueError."""
+    try:
+        latitude, longitude = float(args['lat']), float(args['lng'])
+        miles = float(args.get('miles', config['NEAR_DEFAULT_MILES']))
+    except (KeyError, ValueError):
+        raise ValueError('lat, lng and miles must be numbers')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('lat must be within 90 and lng within 180 degrees')
+    if not 0 < miles <= config['NEAR_MAX_MILES']:
+        raise ValueError('miles must be more than 0 and at most {}'.format(config['NEAR_MAX_MILES']))
+    return latitude, longitude, miles
+
+
+def venues_near(latitude, longitude, miles, limit, shows_per_venue=3):
+    """Venues within miles, nearest first, each with its distance and next
+    few shows. Three queries however many venues match."""
+    found = nearby(latitude, longitude, miles, limit)
+    if not found:
+        return []
+    venue_ids = [venue_id for venue_id, distance in found]
+    venues = {row.id: row for row in db.session.execute(
+        select(Venue.id, Venue.name, Venue.address, Venue.city, Venue.state, Venue.image_link)
+        .where(Venue.id.in_(venue_ids), Venue.deleted_at.is_(None)))}
+    shows = {venue_id: [{
+        'artist_id': show.artist_id,
+        'artist_name': show.artist_name,
+        'artist_image_link': show.artist_image_link,
+        'start_time': show.start_time,
+    } for show in venue_shows] for venue_id, venue_shows in groupby(
+        db.session.execute(queries.upcoming_shows_by_venue(venue_ids, shows_per_venue)),
+        key=attrgetter('venue_id'))}
+    return [dict(venues[venue_id]._asdict(), miles=round(distance, 1),
+                 upcoming_shows=shows.get(venue_id, []))
+            for venue_id, distance in found if venue_id in venues]
+
+
+@event.listens_for(Venue, 'before_update')
+def _forget_moved_location(mapper, connection, venue):
+    # A new city or state makes the geocoded point wrong; the next
+    # flask geocode run fills it in again.
+    state = inspect(venue)
+    moved = state.attrs.city.history.has_changes() or state.attrs.state.history.has_changes()
+    located = state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()
+    if moved and not located:
+        venue.latitude = venue.longitude = None
+
+#----------------------------------------------------------------------------#
+# Offline geocoding.
+#----------------------------------------------------------------------------#
+
+
+def place_key(city, state):
+    return re.sub(r'\s+', ' ', city.replace('.', '').strip().lower()), state.strip().upper()
+
+
+def read_gazetteer(path, format):
+    """{(city, state): (latitude, longitude)} from a CSV with city, state,
+    latitude and longitude columns, or a GeoNames dump (US rows only, the
+    most populous place winning duplicate names)."""
+    places = {}
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            for row in csv.DictReader(source):
+                places[place_key(row['city'], row['state'])] = (
+                    float(row['latitude']), float(row['longitude']))
+            return places
+        population = {}
+        for fields in csv.reader(source, delimiter='\t', quoting=csv.QUOTE_NONE):
+            if len(fields) < 15 or fields[8] != 'US':
+                continue
+            key = place_key(fields[1], fields[10])
+            people = int(fields[14] or 0)
+            if people >= population.get(key, -1):
+                population[key] = people
+                places[key] = (float(fields[4]), float(fields[5]))
+    return places
+
+
+@click.command('geocode')
+@click.argument('gazetteer', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'geonames']), default='csv',
+              show_default=True)
+@click.option('--all', 'overwrite', is_flag=True, help='Also redo venues that have coordinates.')
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def geocode_command(gazetteer, format, overwrite, batch_size):
+    """Set venue coordinates from a local GAZETTEER file."""
+    places = read_gazetteer(gazetteer, format)
+    query = db.session.query(Venue.id, Venue.city, Venue.state)
+    if not overwrite:
+        query = query.filter(Venue.latitude.is_(None))
+    located, missing = [], 0
+    for venue_id, city, state in query:
+        point = places.get(place_key(city, state))
+        if point is None:
+            missing += 1
+        else:
+            located.append({'venue_id': venue_id, 'lat': point[0], 'lng': point[1]})
+    stmt = update(Venue.__table__).where(Venue.__table__.c.id == bindparam('venue_id')).values(
+        latitude=bindparam('lat'), longitude=bindparam('lng'))
+    for start in range(0, len(located), batch_size):
+        db.session.execute(stmt, located[start:start + batch_size])
+        db.session.commit()
+    click.echo('Located {} venues; {} cities not in the gazetteer.'.format(len(located), missing))
+
+
+def init_app(app):
+    app.extensions['geo'] = BACKENDS[app.config['GEO_BACKEND']]()
+    app.cli.add_command(geocode_command)
@@ -0,0 +1,10 @@
+# gunicorn -c gunicorn.conf.py 'app:create_app()'
+bind = '127.0.0.1:4455'
+workers = 4
+
+
+def post_worker_init(worker):
+    # Load every template before the worker accepts connections.
+    import templating
+    count = templating.preload(worker.wsgi)
+    worker.log.info('Preloaded %d templates', count)
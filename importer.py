@@ -0,0 +1,298 @@
+import csv
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from wtforms import StringField
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+import counters
+import feed
+import geo
+import jobs
+import scheduling
+import search
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+# Rows stream from CSV or JSONL through the same WTForms rules as the
+# create forms, then go to the database as chunked executemany INSERTs
+# (psycopg2's execute_values under SQLAlchemy 1.4), one transaction per
+# chunk. Invalid rows are reported with their line number and skipped.
+#
+# CSV list fields (genres) are separated with ';'. Shows reference their
+# artist and venue by artist_id/venue_id or by exact artist/venue name;
+# duration_minutes is optional and rows that double-book are rejected.
+
+LIST_SEPARATOR = ';'
+
+
+def read_rows(path, format, reject):
+    """Yield (line number, dict) pairs from a CSV or JSONL file. JSONL lines
+    that aren't an object go to reject."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    reject(line_num, 'invalid JSON: {}'.format(e))
+                    continue
+                if not isinstance(row, dict):
+                    reject(line_num, 'not a JSON object')
+                    continue
+                yield line_num, row
+
+
+def to_formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif key == 'genres' and isinstance(value, str):
+            formdata.setlist(key, [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()])
+        elif value is not None:
+            formdata[key] = value if isinstance(value, str) else json.dumps(value)
+    return formdata
+
+
+def form_errors(form):
+    return '; '.join('{}: {}'.format(name, ', '.join(errors))
+                     for name, errors in form.errors.items())
+
+
+class NameIndex:
+    """Resolves a natural key (exact name) or id to a primary key."""
+
+    def __init__(self, model):
+        self.label = model.__name__.lower()
+        self.ids = set()
+        self.by_name = defaultdict(list)
+        for entity_id, name in db.session.query(model.id, model.name):
+            self.ids.add(entity_id)
+            self.by_name[name].append(entity_id)
+
+    def resolve(self, row):
+        raw_id = row.get(self.label + '_id')
+        if raw_id not in (None, ''):
+            try:
+                entity_id = int(raw_id)
+            except (TypeError, ValueError):
+                raise ValueError('{}_id: not an integer'.format(self.label))
+            if entity_id not in self.ids:
+                raise ValueError('{}_id: no {} {}'.format(self.label, self.label, entity_id))
+            return entity_id
+        matches = self.by_name.get(row.get(self.label) or '', [])
+        if len(matches) != 1:
+            raise ValueError('{}: {} {!r}'.format(
+                self.label, 'ambiguous' if matches else 'unknown', row.get(self.label)))
+        return matches[0]
+
+
+class EntityImport:
+    form_class = None
+    model = None
+
+    def __init__(self):
+        # One form instance is reprocessed per row instead of rebuilt.
+        self.form = self.form_class(formdata=None, meta={'csrf': False})
+        self.columns = [column.name for column in self.model.__table__.columns
+                        if column.name in self.form._fields]
+        # Missing or null text fields come out as '' rather than None, as
+        # they would from a submitted form.
+        self.blanks = {name: '' for name, field in self.form._fields.items()
+                       if isinstance(field, StringField)}
+
+    def convert(self, row):
+        self.form.process(to_formdata(row), **self.blanks)
+        if not self.form.validate():
+            raise ValueError(form_errors(self.form))
+        return {column: self.form[column].data for column in self.columns}
+
+    def admit(self, batch, reject):
+        """The (line_num, row) pairs of a converted batch to insert."""
+        return batch
+
+    def inserted(self, rows):
+        pass
+
+    def finish(self):
+        # Core INSERTs bypass the ORM events that keep the in-memory
+        # search index current.
+        search.forget(self.model)
+
+
+class VenueImport(EntityImport):
+    form_class = VenueForm
+    model = Venue
+
+    def finish(self):
+        super().finish()
+        geo.forget()
+
+
+class ArtistImport(EntityImport):
+    form_class = ArtistForm
+    model = Artist
+
+
+class ShowImport(EntityImport):
+    form_class = ShowForm
+    model = Show
+
+    def __init__(self):
+        super().__init__()
+        self.venues = NameIndex(Venue)
+        self.artists = NameIndex(Artist)
+        self.venue_ids = set()
+        self.artist_ids = set()
+        # Rejects rows that double-book against the database or each other.
+        self.calendars = scheduling.Calendars()
+
+    def convert(self, row):
+        self.form.process(to_formdata({
+            'venue_id': self.venues.resolve(row),
+            'artist_id': self.artists.resolve(row),
+            'start_time': row.get('start_time'),
+            'duration_minutes': row.get('duration_minutes') or self.form.duration_minutes.default,
+        }))
+        if not self.form.validate():
+            raise ValueError(form_errors(self.form))
+        show = {column: self.form[column].data for column in
+                ('venue_id', 'artist_id', 'start_time', 'duration_minutes')}
+        show['upcoming'] = show['start_time'] > datetime.now()
+        return show
+
+    def admit(self, batch, reject):
+        # Booked per batch, so the calendars load in two queries rather
+        # than two per new venue or artist.
+        self.calendars.load(Show.venue_id, {show['venue_id'] for line_num, show in batch})
+        self.calendars.load(Show.artist_id, {show['artist_id'] for line_num, show in batch})
+        admitted = []
+        for line_num, show in batch:
+            try:
+                self.calendars.book(show['venue_id'], show['artist_id'],
+                                    show['start_time'], show['duration_minutes'])
+            except ValueError as e:
+                reject(line_num, str(e))
+                continue
+            admitted.append((line_num, show))
+        return admitted
+
+    def inserted(self, rows):
+        self.venue_ids.update(row['venue_id'] for row in rows)
+        self.artist_ids.update(row['artist_id'] for row in rows)
+
+    def finish(self):
+        # Core INSERTs bypass the ORM counter and feed events.
+        counters.refresh_show_counts(self.venue_ids, self.artist_ids)
+        feed.refresh()
+
+
+def insert_batch(job, batch, report):
+    """Insert a chunk in one transaction; on failure retry row by row so
+    only the offending rows are rejected. Returns the number inserted."""
+    if not batch:
+        return 0
+    table = job.model.__table__
+    try:
+        db.session.execute(table.insert(), [row for line_num, row in batch])
+        db.session.commit()
+        job.inserted([row for line_num, row in batch])
+        return len(batch)
+    except SQLAlchemyError:
+        db.session.rollback()
+    inserted = 0
+    for line_num, row in batch:
+        try:
+            db.session.execute(table.insert(), [row])
+            db.session.commit()
+            job.inserted([row])
+            inserted += 1
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            report(line_num, str(e.orig if hasattr(e, 'orig') else e).strip())
+    return inserted
+
+
+def run_import(job, path, format, batch_size, report):
+    inserted = rejected = 0
+
+    def reject(line_num, message):
+        nonlocal rejected
+        rejected += 1
+        report(line_num, message)
+
+    batch = []
+    for line_num, row in read_rows(path, format, reject):
+        try:
+            batch.append((line_num, job.convert(row)))
+        except (TypeError, ValueError) as e:
+            # A row that trips up conversion is reported, not fatal.
+            reject(line_num, str(e))
+            continue
+        if len(batch) >= batch_size:
+            inserted += insert_batch(job, job.admit(batch, reject), reject)
+            batch = []
+    if batch:
+        inserted += insert_batch(job, job.admit(batch, reject), reject)
+    job.finish()
+    return inserted, rejected
+
+
+IMPORTS = {
+    'venues': VenueImport,
+    'artists': ArtistImport,
+    'shows': ShowImport,
+}
+
+
+@jobs.task('import', max_attempts=1, timeout=6 * 3600)
+def import_file(kind, path, format, batch_size):
+    """The import job: rejected rows go to the log."""
+    def report(line_num, message):
+        current_app.logger.warning('%s:%s: %s', path, line_num, message)
+
+    inserted, rejected = run_import(IMPORTS[kind](), path, format, batch_size, report)
+    current_app.logger.info('Imported %s %s from %s, rejected %s.', inserted, kind, path, rejected)
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+              help='Defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--background', is_flag=True,
+              help='Queue an import job instead; PATH must be readable by the workers.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, background):
+    """Import KIND rows from PATH, reporting rejected rows on stderr."""
+    format = format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    if background:
+        job_id = jobs.enqueue('import', {'kind': kind, 'path': os.path.abspath(path),
+                                         'format': format, 'batch_size': batch_size})
+        db.session.commit()
+        click.echo('Queued import job {}.'.format(job_id))
+        return
+
+    def report(line_num, message):
+        click.echo('{}:{}: {}'.format(path, line_num, message), err=True)
+
+    inserted, rejected = run_import(IMPORTS[kind](), path, format, batch_size, report)
+    click.echo('Imported {} {}, rejected {}.'.format(inserted, kind, rejected))
+    if rejected:
+        sys.exit(1)
@@ -0,0 +1,229 @@
+import cProfile
+import hmac
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import abort, before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#----------------------------------------------------------------------------#
+# Every request records its query count, DB time, rows fetched, template
+# render time and (with TRACK_ALLOCATIONS) peak traced allocations. They
+# are returned as a Server-Timing header and summed per endpoint for
+# /_debug/metrics. Endpoints listed in PROFILE_ENDPOINTS also get a
+# cProfile dump in PROFILE_DIR, one file per request. A streamed response renders while it is
+# sent, after the response hooks, so it is measured when it closes: its
+# render time is the time spent sending less the queries run meanwhile,
+# and it gets no Server-Timing header, which would be sent before that.
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.peak_bytes = None
+
+
+class MetricsRegistry:
+    """Per-endpoint totals, exported in Prometheus text format."""
+
+    FIELDS = (
+        ('requests_total', 'counter', 'Requests handled.'),
+        ('request_seconds_total', 'counter', 'Time spent handling requests.'),
+        ('db_queries_total', 'counter', 'SQL statements executed.'),
+        ('db_seconds_total', 'counter', 'Time spent executing SQL.'),
+        ('db_rows_total', 'counter', 'Rows reported by the DB driver.'),
+        ('render_seconds_total', 'counter', 'Time spent rendering templates.'),
+        ('peak_alloc_bytes', 'gauge', 'Peak traced allocation of the last request.'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(lambda: defaultdict(float))
+        self.collectors = []
+
+    def record(self, endpoint, metrics, duration):
+        with self.lock:
+            values = self.values[endpoint]
+            values['requests_total'] += 1
+            values['request_seconds_total'] += duration
+            values['db_queries_total'] += metrics.queries
+            values['db_seconds_total'] += metrics.db_seconds
+            values['db_rows_total'] += metrics.rows
+            values['render_seconds_total'] += metrics.render_seconds
+            if metrics.peak_bytes is not None:
+                values['peak_alloc_bytes'] = metrics.peak_bytes
+
+    def add_collector(self, collector):
+        """collector() returns (name, type, help, {labels: value}) tuples
+        for metrics that are sampled at export time."""
+        self.collectors.append(collector)
+
+    def export(self):
+        lines = []
+        with self.lock:
+            for name, kind, help in self.FIELDS:
+                lines.append('# HELP fyyur_{} {}'.format(name, help))
+                lines.append('# TYPE fyyur_{} {}'.format(name, kind))
+                for endpoint, values in sorted(self.values.items()):
+                    if name in values:
+                        lines.append('fyyur_{}{{endpoint="{}"}} {}'.format(
+                            name, endpoint, values[name]))
+        for collector in self.collectors:
+            for name, kind, help, samples in collector():
+                lines.append('# HELP fyyur_{} {}'.format(name, help))
+                lines.append('# TYPE fyyur_{} {}'.format(name, kind))
+                for labels, value in samples.items():
+                    label_text = ','.join('{}="{}"'.format(*label) for label in labels)
+                    lines.append('fyyur_{}{{{}}} {}'.format(name, label_text, value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Counters opened by count_queries(); every statement bumps all of them.
+_query_counters = []
+
+
+def current_metrics():
+    return g.get('request_metrics') if has_app_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    for counter in _query_counters:
+        counter.append(statement)
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_seconds += elapsed
+        metrics.rows += max(cursor.rowcount, 0)
+
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed inside the block."""
+    statements = []
+    _query_counters.append(statements)
+    try:
+        yield statements
+    finally:
+        _query_counters.remove(statements)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Test helper: fail if the block executes more than limit statements.
+
+        with assert_max_queries(3):
+            client.get('/shows')
+    """
+    with count_queries() as statements:
+        yield statements
+    assert len(statements) <= limit, '{} queries executed, expected at most {}:\n{}'.format(
+        len(statements), limit, '\n'.join(statements))
+
+
+def _template_started(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.render_started = time.perf_counter()
+
+
+def _template_rendered(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics.render_started is not None:
+        metrics.render_seconds += time.perf_counter() - metrics.render_started
+        metrics.render_started = None
+
+
+def server_timing(metrics, total):
+    return ', '.join([
+        'db;dur={:.2f};desc="{} queries, {} rows"'.format(
+            metrics.db_seconds * 1000, metrics.queries, metrics.rows),
+        'render;dur={:.2f}'.format(metrics.render_seconds * 1000),
+        'total;dur={:.2f}'.format(total * 1000),
+    ])
+
+
+def init_app(app):
+    track_allocations = app.config['TRACK_ALLOCATIONS']
+    profile_endpoints = set(app.config['PROFILE_ENDPOINTS'])
+    if track_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_rendered, app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = RequestMetrics()
+        if track_allocations:
+            tracemalloc.reset_peak()
+        if request.endpoint in profile_endpoints:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def finish(metrics, endpoint, profiler):
+        """Stop the profiler and record the request; returns its duration."""
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            # Requests in the same second, in any worker, get their own file.
+            profiler.dump_stats(os.path.join(app.config['PROFILE_DIR'], '{}-{}-{}.prof'.format(
+                endpoint, time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:12])))
+        if track_allocations:
+            metrics.peak_bytes = tracemalloc.get_traced_memory()[1]
+        total = time.perf_counter() - metrics.started
+        registry.record(endpoint or 'unmatched', metrics, total)
+        return total
+
+    @app.after_request
+    def finish_request_metrics(response):
+        if response.is_streamed:
+            # Left in g, so the queries run while streaming are counted.
+            metrics = g.get('request_metrics')
+        else:
+            metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        profiler = g.pop('profiler', None)
+        if response.is_streamed:
+            endpoint = request.endpoint
+            sending_started, db_seconds = time.perf_counter(), metrics.db_seconds
+            def finish_streamed():
+                sending = time.perf_counter() - sending_started
+                metrics.render_seconds += sending - (metrics.db_seconds - db_seconds)
+                finish(metrics, endpoint, profiler)
+            response.call_on_close(finish_streamed)
+            return response
+        total = finish(metrics, request.endpoint, profiler)
+        response.headers.add('Server-Timing', server_timing(metrics, total))
+        return response
+
+    if app.config['METRICS_ENDPOINT']:
+        token = app.config['METRICS_TOKEN']
+
+        @app.route('/_debug/metrics')
+        def debug_metrics():
+            if not app.debug and not (token and hmac.compare_digest(
+                    request.headers.get('Authorization', ''), 'Bearer ' + token)):
+                abort(404)
+            return app.response_class(registry.export(), mimetype='text/plain; version=0.0.4')
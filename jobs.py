@@ -0,0 +1,322 @@
+import importlib
+import os
+import signal
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Interval, case, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Job, JobSchedule, utc_now
+import instrumentation
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+# Tasks are functions registered with @task(name). enqueue() inserts a row
+# into jobs, in the caller's transaction unless given a connection. "flask
+# jobs worker" claims runnable rows with SELECT ... FOR UPDATE SKIP LOCKED,
+# so any number of workers share one queue, and runs them on a thread
+# pool. A failed job is retried, waiting JOB_RETRY_SECONDS and doubling
+# each time, until max_attempts. A job still running past its timeout is assumed lost with
+# its worker and requeued. JOB_SCHEDULE queues tasks every N seconds. Each
+# job records its duration_ms; "flask jobs stats" and /_debug/metrics
+# summarise them.
+
+Task = namedtuple('Task', 'function max_attempts timeout')
+
+TASKS = {}
+
+# The job each worker thread is running, for report_progress().
+_running = threading.local()
+
+
+def task(name, max_attempts=None, timeout=None):
+    """Register a function as a job. It is called with the job's args as
+    keyword arguments in an app context; raising fails the attempt."""
+    def decorator(function):
+        TASKS[name] = Task(function, max_attempts, timeout)
+        return function
+    return decorator
+
+
+def seconds(count):
+    return literal(timedelta(seconds=count), Interval())
+
+
+def enqueue(name, args=None, delay=0, unique_key=None, connection=None):
+    """Queue task name to run after delay seconds. With a unique_key, does
+    nothing while a job with that key is still queued. Returns the new job
+    id, or None."""
+    if name not in TASKS:
+        raise ValueError('Unknown job {}'.format(name))
+    config = current_app.config
+    definition = TASKS[name]
+    jobs = Job.__table__
+    stmt = insert(jobs).values(
+        name=name,
+        args=args or {},
+        unique_key=unique_key,
+        max_attempts=definition.max_attempts or config['JOB_MAX_ATTEMPTS'],
+        timeout_seconds=definition.timeout or config['JOB_TIMEOUT_SECONDS'],
+        run_at=utc_now() + seconds(delay),
+    )
+    if unique_key is not None:
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=['unique_key'], index_where=jobs.c.status == 'queued')
+    return (connection or db.session).execute(stmt.returning(jobs.c.id)).scalar()
+
+
+def report_progress(**progress):
+    """Record progress on the running job; it is saved by the task's next
+    commit. Does nothing outside a worker."""
+    job_id = getattr(_running, 'job_id', None)
+    if job_id is not None:
+        jobs = Job.__table__
+        db.session.execute(update(jobs).where(jobs.c.id == job_id).values(progress=progress))
+
+
+def claim(worker_id, limit):
+    """Lock up to limit runnable jobs for worker_id and commit."""
+    jobs = Job.__table__
+    runnable = select(jobs.c.id).where(
+        jobs.c.status == 'queued', jobs.c.run_at <= utc_now()
+    ).order_by(jobs.c.run_at, jobs.c.id).limit(limit).with_for_update(skip_locked=True)
+    claimed = db.session.execute(
+        update(jobs).where(jobs.c.id.in_(runnable)).values(
+            status='running',
+            attempts=jobs.c.attempts + 1,
+            locked_by=worker_id,
+            locked_until=utc_now() + jobs.c.timeout_seconds * seconds(1),
+        ).returning(jobs.c.id, jobs.c.name, jobs.c.args, jobs.c.attempts, jobs.c.max_attempts)
+    ).all()
+    db.session.commit()
+    return claimed
+
+
+def finish(worker_id, job, duration, error=None):
+    jobs = Job.__table__
+    values = {
+        'duration_ms': duration * 1000,
+        'finished_at': utc_now(),
+        'locked_by': None,
+        'locked_until': None,
+        'last_error': error,
+    }
+    if error is None:
+        values['status'] = 'done'
+    elif job.attempts < job.max_attempts:
+        retry_seconds = current_app.config['JOB_RETRY_SECONDS'] * 2 ** (job.attempts - 1)
+        # Requeued without its key: a newer queued job may already hold it.
+        values.update(status='queued', unique_key=None, run_at=utc_now() + seconds(retry_seconds))
+    else:
+        values['status'] = 'failed'
+    # A job requeued as lost belongs to whoever claimed it next.
+    db.session.execute(update(jobs).where(
+        jobs.c.id == job.id, jobs.c.locked_by == worker_id).values(**values))
+    db.session.commit()
+
+
+def run(app, worker_id, job):
+    with app.app_context():
+        started = time.perf_counter()
+        _running.job_id = job.id
+        try:
+            definition = TASKS.get(job.name)
+            if definition is None:
+                raise LookupError('No task named {}'.format(job.name))
+            definition.function(**job.args)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Job %s (%s) failed', job.id, job.name)
+            finish(worker_id, job, time.perf_counter() - started,
+                   '{}: {}'.format(type(e).__name__, e))
+        else:
+            finish(worker_id, job, time.perf_counter() - started)
+        finally:
+            _running.job_id = None
+
+
+def requeue_lost():
+    """Requeue (or fail, if out of attempts) jobs running past their
+    timeout. Returns how many there were."""
+    jobs = Job.__table__
+    lost = db.session.execute(update(jobs).where(
+        jobs.c.status == 'running', jobs.c.locked_until < utc_now()
+    ).values(
+        status=case((jobs.c.attempts < jobs.c.max_attempts, 'queued'), else_='failed'),
+        unique_key=None,
+        locked_by=None,
+        locked_until=None,
+        last_error='Timed out: still running after timeout_seconds or its worker died',
+    )).rowcount
+    db.session.commit()
+    return lost
+
+
+def queue_scheduled(schedule):
+    """Queue every task in schedule ({name: seconds}) that is due. The
+    UPDATE ... RETURNING means only one worker queues each run."""
+    schedules = JobSchedule.__table__
+    for name, interval in schedule.items():
+        due = db.session.execute(update(schedules).where(
+            schedules.c.name == name, schedules.c.next_run_at <= utc_now()
+        ).values(next_run_at=utc_now() + seconds(interval)).returning(schedules.c.name)).first()
+        if due is not None:
+            enqueue(name, unique_key='schedule:{}'.format(name))
+    db.session.commit()
+
+
+class Worker:
+    def __init__(self, app, threads, poll_seconds):
+        self.app = app
+        self.id = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.threads = threads
+        self.poll_seconds = poll_seconds
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='job')
+        self.in_flight = set()
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def submit(self, job):
+        future = self.pool.submit(run, self.app, self.id, job)
+        self.in_flight.add(future)
+        future.add_done_callback(self.in_flight.discard)
+
+    def run(self, until_empty=False):
+        schedule = self.app.config['JOB_SCHEDULE']
+        with self.app.app_context():
+            if schedule:
+                db.session.execute(insert(JobSchedule.__table__).values([
+                    {'name': name, 'next_run_at': utc_now()} for name in schedule
+                ]).on_conflict_do_nothing())
+                db.session.commit()
+        try:
+            while not self.stopping.is_set():
+                with self.app.app_context():
+                    queue_scheduled(schedule)
+                    requeue_lost()
+                    free = self.threads - len(self.in_flight)
+                    claimed = claim(self.id, free) if free > 0 else []
+                for job in claimed:
+                    self.submit(job)
+                if until_empty and not claimed and not self.in_flight:
+                    break
+                if not claimed:
+                    self.stopping.wait(self.poll_seconds)
+        finally:
+            self.pool.shutdown(wait=True)
+
+
+@task('jobs.prune')
+def prune(days=None, batch_size=5000):
+    """Delete finished jobs older than JOB_KEEP_DAYS, in batches."""
+    jobs = Job.__table__
+    cutoff = utc_now() - seconds(86400 * (days or current_app.config['JOB_KEEP_DAYS']))
+    while True:
+        batch = select(jobs.c.id).where(
+            jobs.c.status.in_(('done', 'failed')), jobs.c.finished_at < cutoff
+        ).limit(batch_size)
+        deleted = db.session.execute(delete(jobs).where(jobs.c.id.in_(batch))).rowcount
+        db.session.commit()
+        if deleted < batch_size:
+            return
+
+
+def job_metrics(app):
+    def collect():
+        jobs = Job.__table__
+        with app.app_context():
+            rows = db.session.execute(select(
+                jobs.c.name, jobs.c.status, func.count(),
+                func.coalesce(func.sum(jobs.c.duration_ms), 0) / 1000
+            ).group_by(jobs.c.name, jobs.c.status)).all()
+        counts, durations = {}, {}
+        for name, status, count, duration in rows:
+            labels = (('job', name), ('status', status))
+            counts[labels] = count
+            durations[labels] = duration
+        return [
+            ('jobs', 'gauge', 'Jobs in the jobs table.', counts),
+            ('job_seconds', 'gauge', 'Run time of the jobs in the jobs table.', durations),
+        ]
+    return collect
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+def load_task_modules(app):
+    for name in app.config['JOB_TASK_MODULES']:
+        importlib.import_module(name)
+
+
+@jobs_cli.command('worker')
+@click.option('--threads', type=int, help='Defaults to JOB_THREADS.')
+@click.option('--until-empty', is_flag=True, help='Exit once no job is runnable.')
+def worker_command(threads, until_empty):
+    """Run queued and scheduled jobs until interrupted."""
+    app = current_app._get_current_object()
+    load_task_modules(app)
+    unknown = sorted(set(app.config['JOB_SCHEDULE']) - set(TASKS))
+    if unknown:
+        raise click.UsageError('JOB_SCHEDULE names unknown jobs: {}'.format(', '.join(unknown)))
+    worker = Worker(app, threads or app.config['JOB_THREADS'], app.config['JOB_POLL_SECONDS'])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    click.echo('Worker {} running {} threads.'.format(worker.id, worker.threads))
+    worker.run(until_empty)
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--arg', 'args', multiple=True, metavar='KEY=VALUE')
+def enqueue_command(name, args):
+    """Queue task NAME with string arguments."""
+    load_task_modules(current_app)
+    try:
+        job_id = enqueue(name, dict(arg.split('=', 1) for arg in args))
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    db.session.commit()
+    click.echo('Queued job {}.'.format(job_id))
+
+
+@jobs_cli.command('stats')
+@click.option('--hours', default=24, show_default=True)
+def stats_command(hours):
+    """Per-task counts and run times for jobs finished in the last HOURS."""
+    jobs = Job.__table__
+    rows = db.session.execute(select(
+        jobs.c.name, jobs.c.status, func.count(),
+        func.avg(jobs.c.duration_ms),
+        func.percentile_cont(0.95).within_group(jobs.c.duration_ms),
+        func.max(jobs.c.duration_ms),
+    ).where(
+        jobs.c.finished_at >= utc_now() - seconds(3600 * hours)
+    ).group_by(jobs.c.name, jobs.c.status).order_by(jobs.c.name, jobs.c.status)).all()
+    waiting = dict(db.session.execute(select(jobs.c.status, func.count()).where(
+        jobs.c.status.in_(('queued', 'running'))).group_by(jobs.c.status)).all())
+    click.echo('{:<24} {:<8} {:>8} {:>10} {:>10} {:>10}'.format(
+        'job', 'status', 'count', 'avg ms', 'p95 ms', 'max ms'))
+    for name, status, count, average, p95, longest in rows:
+        click.echo('{:<24} {:<8} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            name, status, count, average or 0, p95 or 0, longest or 0))
+    click.echo('Queued: {}, running: {}.'.format(waiting.get('queued', 0), waiting.get('running', 0)))
+    for job_id, name, args, progress in db.session.execute(select(
+            jobs.c.id, jobs.c.name, jobs.c.args, jobs.c.progress
+    ).where(jobs.c.status == 'running').order_by(jobs.c.id)):
+        click.echo('  job {} {} {}: {}'.format(job_id, name, args, progress or 'no progress reported'))
+
+
+def init_app(app):
+    instrumentation.registry.add_collector(job_metrics(app))
+    app.cli.add_command(jobs_cli)
@@ -0,0 +1,220 @@
+"""Load test every route of a running Fyyur server.
+
+    python loadtest.py --base-url http://127.0.0.1:4455 --requests 200
+    python loadtest.py --save-baseline      # record loadtest_baseline.json
+    python loadtest.py                      # compare against the baseline
+    python loadtest.py --concurrency 500 --routes api_venues,api_artists,api_shows
+    python loadtest.py --startup "gunicorn -c gunicorn.conf.py app:create_app()"
+    python loadtest.py --import-budget 400
+
+Each route is hit by --concurrency workers. p50/p99 latency, throughput
+and queries per request (from the Server-Timing header) are reported per
+route. With a
+baseline present, the run exits 1 if any route's p50 or p99 grows by more
+than --tolerance, or its query count grows at all.
+
+--startup launches the server command itself and reports the time to its
+first response, then the latency of the first hit on every route.
+--import-budget runs create_app() under `python -X importtime` and exits 1
+if importing and building the app takes longer than the budget.
+"""
+
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_baseline.json')
+
+
+def fetch(base_url, method, path, form=None):
+    data = urlencode(form).encode() if form else None
+    request = Request(base_url + path, data=data, method=method)
+    started = time.perf_counter()
+    try:
+        with urlopen(request) as response:
+            response.read()
+            headers = response.headers
+    except HTTPError as e:
+        headers = e.headers
+        if e.code >= 500:
+            raise
+    elapsed = time.perf_counter() - started
+    match = re.search(r'(\d+) queries', headers.get('Server-Timing', ''))
+    return elapsed, int(match.group(1)) if match else None
+
+
+def sample_ids(base_url, resource):
+    with urlopen('{}/api/v1/{}?fields=id&limit=20'.format(base_url, resource)) as response:
+        return [row['id'] for row in json.load(response)['data']]
+
+
+def routes(base_url):
+    """(name, method, path, form) for every route in app.py."""
+    venue_ids = sample_ids(base_url, 'venues') or [1]
+    artist_ids = sample_ids(base_url, 'artists') or [1]
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('show_venue', 'GET', '/venues/{}'.format(venue_ids[0]), None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': 'the'}),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('edit_venue', 'GET', '/venues/{}/edit'.format(venue_ids[-1]), None),
+        ('venues_faceted', 'GET', '/venues?genre=Jazz&state=CA&seeking=1', None),
+        ('venues_near', 'GET', '/venues/near?lat=37.7749&lng=-122.4194&miles=50', None),
+        ('artists', 'GET', '/artists', None),
+        ('artists_faceted', 'GET', '/artists?genre=Rock_n_Roll&genre=Blues', None),
+        ('show_artist', 'GET', '/artists/{}'.format(artist_ids[0]), None),
+        ('search_artists', 'POST', '/artists/search', {'search_term': 'band'}),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('edit_artist', 'GET', '/artists/{}/edit'.format(artist_ids[-1]), None),
+        ('shows', 'GET', '/shows', None),
+        ('upcoming_shows', 'GET', '/shows/upcoming', None),
+        ('upcoming_city', 'GET', '/shows/upcoming?state=CA&city=San+Francisco', None),
+        ('upcoming_genre', 'GET', '/shows/upcoming?genre=Jazz', None),
+        ('create_shows', 'GET', '/shows/create', None),
+        ('api_venues', 'GET', '/api/v1/venues', None),
+        ('api_artists', 'GET', '/api/v1/artists', None),
+        ('api_shows', 'GET', '/api/v1/shows', None),
+        ('api_venues_near', 'GET', '/api/v1/venues/near?lat=40.7128&lng=-74.0060', None),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run(base_url, requests, concurrency, only=None):
+    results = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        for name, method, path, form in routes(base_url):
+            if only and name not in only:
+                continue
+            started = time.perf_counter()
+            samples = list(pool.map(lambda _: fetch(base_url, method, path, form), range(requests)))
+            wall = time.perf_counter() - started
+            latencies = [elapsed for elapsed, queries in samples]
+            queries = [queries for elapsed, queries in samples if queries is not None]
+            results[name] = {
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'queries': max(queries) if queries else None,
+                'rps': round(requests / wall, 1),
+            }
+    return results
+
+
+def startup(base_url, command, timeout=60):
+    server = subprocess.Popen(shlex.split(command))
+    started = time.perf_counter()
+    try:
+        while True:
+            try:
+                fetch(base_url, 'GET', '/')
+                break
+            except (URLError, ConnectionError):
+                if server.poll() is not None or time.perf_counter() - started > timeout:
+                    raise SystemExit('Server did not answer within {}s.'.format(timeout))
+                time.sleep(0.01)
+        print('{:<20} {:>8.2f} ms'.format('first response', (time.perf_counter() - started) * 1000))
+        for name, method, path, form in routes(base_url):
+            elapsed, queries = fetch(base_url, method, path, form)
+            print('{:<20} {:>8.2f} ms'.format(name, elapsed * 1000))
+    finally:
+        server.terminate()
+        server.wait()
+    return 0
+
+
+def import_times():
+    """(ms, module) for each top-level import made by importing the app and
+    calling create_app(), cumulative over the modules each one pulls in."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(result.stderr)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S.*)$', line)
+        if match:
+            modules.append((int(match.group(1)) / 1000, match.group(2)))
+    return modules
+
+
+def import_time(budget_ms):
+    modules = import_times()
+    total = sum(ms for ms, name in modules)
+    for ms, name in sorted(modules, reverse=True)[:15]:
+        print('{:<30} {:>8.1f} ms'.format(name, ms))
+    print('{:<30} {:>8.1f} ms (budget {} ms)'.format('total', total, budget_ms))
+    return 1 if total > budget_ms else 0
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if result[key] > expected[key] * (1 + tolerance):
+                failures.append('{} {}: {} > {}'.format(name, key, result[key], expected[key]))
+        if None not in (result['queries'], expected['queries']) and result['queries'] > expected['queries']:
+            failures.append('{} queries: {} > {}'.format(name, result['queries'], expected['queries']))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:4455')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route.')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative latency growth over the baseline.')
+    parser.add_argument('--routes', help='Comma-separated route names to run, default all.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--startup', metavar='COMMAND',
+                        help='Start the server with COMMAND and time its first responses.')
+    parser.add_argument('--import-budget', type=float, metavar='MS',
+                        help='Fail if importing and creating the app takes longer.')
+    args = parser.parse_args()
+
+    if args.import_budget is not None:
+        return import_time(args.import_budget)
+    if args.startup:
+        return startup(args.base_url.rstrip('/'), args.startup)
+
+    only = set(args.routes.split(',')) if args.routes else None
+    results = run(args.base_url.rstrip('/'), args.requests, args.concurrency, only)
+    for name, result in results.items():
+        print('{:<20} p50 {:>8.2f} ms  p99 {:>8.2f} ms  {:>8.1f} req/s  queries {}'.format(
+            name, result['p50_ms'], result['p99_ms'], result['rps'], result['queries']))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}; run with --save-baseline first.'.format(args.baseline))
+        return 0
+    with open(args.baseline) as baseline_file:
+        failures = regressions(results, json.load(baseline_file), args.tolerance)
+    for failure in failures:
+        print('REGRESSION ' + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""add indexes for show lookups and area grouping
+
+Revision ID: a41c9e5d2f07
+Revises: 0272f063b10d
+Create Date: 2026-10-18 09:12:40.518233
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c9e5d2f07'
+down_revision = '0272f063b10d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_Venue_city_state', 'Venue', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_city_state', table_name='Venue')
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,31 @@
+"""add Venue latitude/longitude and an earthdistance GiST index
+
+Revision ID: a9d3e5b17c62
+Revises: f6c2d8e4a157
+Create Date: 2026-10-18 14:02:47.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5b17c62'
+down_revision = 'f6c2d8e4a157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_Venue_earth', 'Venue', [sa.text('ll_to_earth(latitude, longitude)')],
+                    unique=False, postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('ix_Venue_earth', table_name='Venue')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
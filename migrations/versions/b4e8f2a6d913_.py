@@ -0,0 +1,56 @@
+"""add the feed_upcoming_shows materialized views
+
+Revision ID: b4e8f2a6d913
+Revises: a9d3e5b17c62
+Create Date: 2026-10-18 14:37:52.604119
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8f2a6d913'
+down_revision = 'a9d3e5b17c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('''
+        CREATE MATERIALIZED VIEW feed_upcoming_shows AS
+        SELECT shows.id AS show_id,
+               shows.start_time,
+               shows.duration_minutes,
+               "Venue".id AS venue_id,
+               "Venue".name AS venue_name,
+               "Venue".city,
+               "Venue".state,
+               "Venue".image_link AS venue_image_link,
+               "Artist".id AS artist_id,
+               "Artist".name AS artist_name,
+               "Artist".image_link AS artist_image_link,
+               "Artist".genres
+        FROM shows
+        JOIN "Venue" ON "Venue".id = shows.venue_id
+        JOIN "Artist" ON "Artist".id = shows.artist_id
+        WHERE shows.start_time >= localtimestamp
+    ''')
+    op.execute('''
+        CREATE MATERIALIZED VIEW feed_upcoming_show_genres AS
+        SELECT DISTINCT unnest(genres) AS genre, start_time, show_id
+        FROM feed_upcoming_shows
+    ''')
+    # REFRESH ... CONCURRENTLY needs a unique index on each view.
+    op.create_index('ix_feed_upcoming_shows_show_id', 'feed_upcoming_shows', ['show_id'],
+                    unique=True)
+    op.create_index('ix_feed_upcoming_shows_start_time', 'feed_upcoming_shows',
+                    ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_feed_upcoming_shows_city', 'feed_upcoming_shows',
+                    ['state', 'city', 'start_time', 'show_id'], unique=False)
+    op.create_index('ix_feed_upcoming_show_genres', 'feed_upcoming_show_genres',
+                    ['genre', 'start_time', 'show_id'], unique=True)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW feed_upcoming_show_genres')
+    op.execute('DROP MATERIALIZED VIEW feed_upcoming_shows')
@@ -0,0 +1,61 @@
+"""add trigger-maintained search columns to Venue and Artist
+
+Revision ID: b7d21f4c9a13
+Revises: a41c9e5d2f07
+Create Date: 2026-10-18 10:03:17.264810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d21f4c9a13'
+down_revision = 'a41c9e5d2f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.add_column(table, sa.Column('search_text', sa.Text(), nullable=True))
+
+    op.execute("""
+        CREATE FUNCTION search_fields_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_text := concat_ws(' ', NEW.name, NEW.city, NEW.state,
+                                         array_to_string(NEW.genres, ' '));
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', concat_ws(' ', NEW.city, NEW.state)), 'B') ||
+                setweight(to_tsvector('simple', array_to_string(NEW.genres, ' ')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('Venue', 'Artist'):
+        op.execute("""
+            CREATE TRIGGER "{0}_search_fields_update"
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON "{0}"
+            FOR EACH ROW EXECUTE FUNCTION search_fields_update()
+        """.format(table))
+        # Fire the trigger once for existing rows.
+        op.execute('UPDATE "{}" SET name = name'.format(table))
+        op.create_index('ix_{}_search_vector'.format(table), table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+        op.create_index('ix_{}_search_text_trgm'.format(table), table, ['search_text'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_search_text_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_vector'.format(table), table_name=table)
+        op.execute('DROP TRIGGER "{0}_search_fields_update" ON "{0}"'.format(table))
+        op.drop_column(table, 'search_text')
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION search_fields_update()')
@@ -0,0 +1,43 @@
+"""add cached show counters to Venue and Artist
+
+Revision ID: c58e0a7b3d41
+Revises: b7d21f4c9a13
+Create Date: 2026-10-18 11:26:52.907341
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58e0a7b3d41'
+down_revision = 'b7d21f4c9a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+
+    # Show.upcoming was only ever set on insert; make it current first.
+    op.execute('UPDATE shows SET upcoming = start_time > now()')
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute("""
+            UPDATE "{0}" SET
+                upcoming_show_count = (SELECT count(*) FROM shows
+                                       WHERE shows.{1} = "{0}".id AND shows.upcoming),
+                past_show_count = (SELECT count(*) FROM shows
+                                   WHERE shows.{1} = "{0}".id AND NOT shows.upcoming),
+                next_show_at = (SELECT min(start_time) FROM shows
+                                WHERE shows.{1} = "{0}".id AND shows.upcoming)
+        """.format(table, fk))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
@@ -0,0 +1,59 @@
+"""add jobs and job_schedules tables for the background job queue
+
+Revision ID: c7a1d4e9f305
+Revises: b4e8f2a6d913
+Create Date: 2026-10-18 15:12:26.871430
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a1d4e9f305'
+down_revision = 'b4e8f2a6d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('args', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='queued', nullable=False),
+    sa.Column('unique_key', sa.String(length=200), nullable=True),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('timeout_seconds', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False),
+    sa.Column('locked_by', sa.String(length=120), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('duration_ms', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_queued_run_at', 'jobs', ['run_at', 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_jobs_queued_unique_key', 'jobs', ['unique_key'], unique=True,
+                    postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_jobs_running_locked_until', 'jobs', ['locked_until'], unique=False,
+                    postgresql_where=sa.text("status = 'running'"))
+    op.create_index('ix_jobs_finished_at', 'jobs', ['finished_at'], unique=False)
+    op.create_table('job_schedules',
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('next_run_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('job_schedules')
+    op.drop_index('ix_jobs_finished_at', table_name='jobs')
+    op.drop_index('ix_jobs_running_locked_until', table_name='jobs')
+    op.drop_index('ix_jobs_queued_unique_key', table_name='jobs')
+    op.drop_index('ix_jobs_queued_run_at', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,92 @@
+"""soft delete venues and artists, cascade their shows, job progress
+
+Revision ID: d5b9e3c2a718
+Revises: c7a1d4e9f305
+Create Date: 2026-10-18 15:48:03.127594
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b9e3c2a718'
+down_revision = 'c7a1d4e9f305'
+branch_labels = None
+depends_on = None
+
+
+FEED_VIEW = '''
+    CREATE MATERIALIZED VIEW feed_upcoming_shows AS
+    SELECT shows.id AS show_id,
+           shows.start_time,
+           shows.duration_minutes,
+           "Venue".id AS venue_id,
+           "Venue".name AS venue_name,
+           "Venue".city,
+           "Venue".state,
+           "Venue".image_link AS venue_image_link,
+           "Artist".id AS artist_id,
+           "Artist".name AS artist_name,
+           "Artist".image_link AS artist_image_link,
+           "Artist".genres
+    FROM shows
+    JOIN "Venue" ON "Venue".id = shows.venue_id
+    JOIN "Artist" ON "Artist".id = shows.artist_id
+    WHERE shows.start_time >= localtimestamp{}
+'''
+
+NOT_DELETED = '''
+      AND "Venue".deleted_at IS NULL
+      AND "Artist".deleted_at IS NULL'''
+
+
+def create_feed_views(where):
+    op.execute('DROP MATERIALIZED VIEW feed_upcoming_show_genres')
+    op.execute('DROP MATERIALIZED VIEW feed_upcoming_shows')
+    op.execute(FEED_VIEW.format(where))
+    op.execute('''
+        CREATE MATERIALIZED VIEW feed_upcoming_show_genres AS
+        SELECT DISTINCT unnest(genres) AS genre, start_time, show_id
+        FROM feed_upcoming_shows
+    ''')
+    op.create_index('ix_feed_upcoming_shows_show_id', 'feed_upcoming_shows', ['show_id'],
+                    unique=True)
+    op.create_index('ix_feed_upcoming_shows_start_time', 'feed_upcoming_shows',
+                    ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_feed_upcoming_shows_city', 'feed_upcoming_shows',
+                    ['state', 'city', 'start_time', 'show_id'], unique=False)
+    op.create_index('ix_feed_upcoming_show_genres', 'feed_upcoming_show_genres',
+                    ['genre', 'start_time', 'show_id'], unique=True)
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('Artist', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_Venue_deleted_at', 'Venue', ['deleted_at'], unique=False,
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'))
+    op.create_index('ix_Artist_deleted_at', 'Artist', ['deleted_at'], unique=False,
+                    postgresql_where=sa.text('deleted_at IS NOT NULL'))
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'Venue', ['venue_id'], ['id'],
+                          ondelete='CASCADE')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'Artist', ['artist_id'], ['id'],
+                          ondelete='CASCADE')
+    op.add_column('jobs', sa.Column('progress', postgresql.JSONB(astext_type=sa.Text()),
+                                    nullable=True))
+    create_feed_views(NOT_DELETED)
+
+
+def downgrade():
+    create_feed_views('')
+    op.drop_column('jobs', 'progress')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'Artist', ['artist_id'], ['id'])
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'Venue', ['venue_id'], ['id'])
+    op.drop_index('ix_Artist_deleted_at', table_name='Artist')
+    op.drop_index('ix_Venue_deleted_at', table_name='Venue')
+    op.drop_column('Artist', 'deleted_at')
+    op.drop_column('Venue', 'deleted_at')
@@ -0,0 +1,40 @@
+"""add show durations and exclusion constraints against double bookings
+
+Revision ID: e3a7c91f5b28
+Revises: d2f4b8a61c95
+Create Date: 2026-10-18 13:05:42.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7c91f5b28'
+down_revision = 'd2f4b8a61c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gist lets the integer ids share a GiST index with the range.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), nullable=False,
+                                     server_default='120'))
+    op.execute("""
+        ALTER TABLE shows ADD COLUMN slot tsrange GENERATED ALWAYS AS
+            (tsrange(start_time, start_time + duration_minutes * interval '1 minute', '[)')) STORED
+    """)
+    # Fails, naming the clashing shows, if existing data double-books a
+    # venue or artist; move or shorten those shows and rerun.
+    op.execute('ALTER TABLE shows ADD CONSTRAINT ex_shows_venue_slot '
+               'EXCLUDE USING gist (venue_id WITH =, slot WITH &&)')
+    op.execute('ALTER TABLE shows ADD CONSTRAINT ex_shows_artist_slot '
+               'EXCLUDE USING gist (artist_id WITH =, slot WITH &&)')
+
+
+def downgrade():
+    op.drop_constraint('ex_shows_artist_slot', 'shows')
+    op.drop_constraint('ex_shows_venue_slot', 'shows')
+    op.drop_column('shows', 'slot')
+    op.drop_column('shows', 'duration_minutes')
@@ -0,0 +1,27 @@
+"""add GIN indexes on genres and an Artist city/state index for facets
+
+Revision ID: f6c2d8e4a157
+Revises: e3a7c91f5b28
+Create Date: 2026-10-18 13:31:09.542871
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c2d8e4a157'
+down_revision = 'e3a7c91f5b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_Artist_city_state', 'Artist', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_city_state', table_name='Artist')
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
@@ -1,14 +1,36 @@
 from sqlalchemy import Column, String, Integer, Boolean, DateTime, ARRAY, ForeignKey
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-db = SQLAlchemy()
+from sqlalchemy import func
+from sqlalchemy import Computed
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, JSONB, TSRANGE, TSVECTOR
+from replicas import RoutingSQLAlchemy
+db = RoutingSQLAlchemy()
+
+
+def utc_now():
+    return func.timezone('utc', func.now())
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
-class Venue(db.Model):
+class SoftDeleted:
+    # Set on delete; ORM queries skip these rows until the purge job
+    # removes them, see deletes.py.
+    deleted_at = db.Column(db.DateTime)
+
+
+class Venue(SoftDeleted, db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        db.Index('ix_Venue_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+        db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Venue_search_text_trgm', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -22,12 +44,39 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean,nullable=False, default=False)
     seeking_description = db.Column(db.String(500), default='')
-    shows = db.relationship('Show',backref='venue',lazy='joined', cascade='all, delete')
+    # Set by "flask geocode", see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # Maintained by the search_fields_update trigger, see search.py.
+    search_vector = db.Column(TSVECTOR)
+    search_text = db.Column(db.Text)
+    # Cached show counters, maintained by counters.py.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(),
+                           onupdate=utc_now(), server_default=utc_now())
+    shows = db.relationship('Show',backref='venue',lazy='select', cascade='all, delete',
+                            passive_deletes=True)
+
 
+# earthdistance's earth_box() @> ll_to_earth() radius lookups, see geo.py.
+db.Index('ix_Venue_earth', func.ll_to_earth(Venue.latitude, Venue.longitude),
+         postgresql_using='gist')
 
 
-class Artist(db.Model):
+class Artist(SoftDeleted, db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_city_state', 'city', 'state'),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+        db.Index('ix_Artist_deleted_at', 'deleted_at',
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+        db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Artist_search_text_trgm', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -40,16 +89,83 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean,nullable=False, default=False)
     seeking_description = db.Column(db.Text)
-    shows = db.relationship('Show',backref='artist',lazy='joined',cascade="all, delete")
+    # Maintained by the search_fields_update trigger, see search.py.
+    search_vector = db.Column(TSVECTOR)
+    search_text = db.Column(db.Text)
+    # Cached show counters, maintained by counters.py.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(),
+                           onupdate=utc_now(), server_default=utc_now())
+    shows = db.relationship('Show',backref='artist',lazy='select',cascade="all, delete",
+                            passive_deletes=True)
 
 
 
 class Show(db.Model):
     __tablename__ = 'shows'
-    
+    __table_args__ = (
+        # The composites also serve plain venue_id/artist_id lookups.
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.Index('ix_shows_updated_at', 'updated_at'),
+        # No double bookings; the GiST indexes also serve scheduling.py.
+        ExcludeConstraint(('venue_id', '='), ('slot', '&&'),
+                          name='ex_shows_venue_slot', using='gist'),
+        ExcludeConstraint(('artist_id', '='), ('slot', '&&'),
+                          name='ex_shows_artist_slot', using='gist'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
-    artist_id = db.Column(db.Integer,db.ForeignKey('Artist.id'),nullable=False)
-    venue_id = db.Column(db.Integer,db.ForeignKey('Venue.id'),nullable=False)
+    artist_id = db.Column(db.Integer,db.ForeignKey('Artist.id', ondelete='CASCADE'),nullable=False)
+    venue_id = db.Column(db.Integer,db.ForeignKey('Venue.id', ondelete='CASCADE'),nullable=False)
     upcoming = db.Column(db.Boolean, nullable=False, default=True)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=120, server_default='120')
+    slot = db.Column(TSRANGE, Computed(
+        "tsrange(start_time, start_time + duration_minutes * interval '1 minute', '[)')",
+        persisted=True))
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(),
+                           onupdate=utc_now(), server_default=utc_now())
+
+
+# Background work, see jobs.py.
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # The queue itself: runnable jobs in run order, see jobs.claim().
+        db.Index('ix_jobs_queued_run_at', 'run_at', 'id',
+                 postgresql_where=db.text("status = 'queued'")),
+        # At most one queued job per unique_key.
+        db.Index('ix_jobs_queued_unique_key', 'unique_key', unique=True,
+                 postgresql_where=db.text("status = 'queued'")),
+        db.Index('ix_jobs_running_locked_until', 'locked_until',
+                 postgresql_where=db.text("status = 'running'")),
+        db.Index('ix_jobs_finished_at', 'finished_at'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(JSONB, nullable=False, default=dict, server_default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')
+    unique_key = db.Column(db.String(200))
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    timeout_seconds = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=utc_now(), server_default=utc_now())
+    locked_by = db.Column(db.String(120))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    progress = db.Column(JSONB)
+    duration_ms = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, nullable=False, default=utc_now(), server_default=utc_now())
+    finished_at = db.Column(db.DateTime)
+
+
+class JobSchedule(db.Model):
+    __tablename__ = 'job_schedules'
 
+    name = db.Column(db.String(120), primary_key=True)
+    next_run_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,107 @@
+from datetime import datetime
+from sqlalchemy import func, select, tuple_
+from models import Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+# Statements shared by the HTML views and the JSON API. Each function
+# returns a select(); callers decide how to execute and shape the rows.
+# They leave soft-deleted venues and artists out themselves, since
+# asgi.py runs them on asyncpg, outside the session hook in deletes.py.
+
+VENUE_COLUMNS = {
+    column: getattr(Venue, column) for column in (
+        'id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+        'image_link', 'facebook_link', 'website_link', 'seeking_talent',
+        'seeking_description', 'upcoming_show_count', 'past_show_count',
+        'next_show_at')
+}
+
+ARTIST_COLUMNS = {
+    column: getattr(Artist, column) for column in (
+        'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+        'facebook_link', 'website_link', 'seeking_venue',
+        'seeking_description', 'upcoming_show_count', 'past_show_count',
+        'next_show_at')
+}
+
+SHOW_COLUMNS = {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'duration_minutes': Show.duration_minutes,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name.label('venue_name'),
+    'venue_image_link': Venue.image_link.label('venue_image_link'),
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name.label('artist_name'),
+    'artist_image_link': Artist.image_link.label('artist_image_link'),
+}
+
+
+def venue_areas(*criteria):
+    # Ordered so the city/state groups can be built in one pass.
+    return select(
+        Venue.city, Venue.state, Venue.id, Venue.name,
+        Venue.upcoming_show_count.label('num_upcoming_shows')
+    ).where(Venue.deleted_at.is_(None), *criteria).order_by(Venue.state, Venue.city, Venue.id)
+
+
+def entity_page(model, columns, after_id=None, limit=None):
+    """Venues or artists in id order, keyset-paginated on id."""
+    stmt = select(*columns).where(model.deleted_at.is_(None)).order_by(model.id)
+    if after_id is not None:
+        stmt = stmt.where(model.id > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def entity(model, columns, entity_id):
+    return select(*columns).where(model.id == entity_id, model.deleted_at.is_(None))
+
+
+def parse_show_cursor(cursor):
+    """Cursors are "<start_time isoformat>_<show id>"; raises ValueError."""
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_cursor(row):
+    return '{}_{}'.format(row.start_time.isoformat(), row.id)
+
+
+def shows_page(columns, cursor=None, limit=None, venue_id=None, artist_id=None):
+    """Shows with their venue and artist joined in, keyset-paginated on
+    (start_time, id). columns must include id and start_time."""
+    stmt = select(*columns).select_from(Show).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ).where(
+        Venue.deleted_at.is_(None), Artist.deleted_at.is_(None)
+    ).order_by(Show.start_time, Show.id)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Show.start_time, Show.id) > cursor)
+    if venue_id is not None:
+        stmt = stmt.where(Show.venue_id == venue_id)
+    if artist_id is not None:
+        stmt = stmt.where(Show.artist_id == artist_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def upcoming_shows_by_venue(venue_ids, per_venue):
+    """The next per_venue shows at each of the venues, ordered by venue
+    and start time."""
+    ranked = select(
+        Show.venue_id, Show.start_time, Show.artist_id,
+        Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+        func.row_number().over(partition_by=Show.venue_id, order_by=Show.start_time).label('rank')
+    ).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id).where(
+        Show.venue_id.in_(venue_ids), Show.start_time >= datetime.now(),
+        Venue.deleted_at.is_(None), Artist.deleted_at.is_(None)
+    ).subquery('ranked')
+    return select(ranked).where(ranked.c.rank <= per_venue).order_by(
+        ranked.c.venue_id, ranked.c.start_time)
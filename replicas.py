@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#----------------------------------------------------------------------------#
+# Each URL in SQLALCHEMY_REPLICAS becomes a "replica<N>" bind. GET/HEAD
+# requests, and POST views marked @read_only, pick one replica and read
+# from it for the whole request; flushes always go to the primary. A
+# client that commits a write stays on the primary for
+# REPLICA_STICKY_SECONDS (tracked in its session cookie) so the redirect
+# after a create or edit reads its own write. CLI commands and requests
+# without replicas configured use the primary only.
+
+STICKY_KEY = 'db_primary_until'
+
+# Monotonic time of this process's last committed write, see may_be_stale().
+_last_write = 0.0
+_last_write_lock = threading.Lock()
+
+
+def read_only(view):
+    """Mark a non-GET view as safe to serve from a replica."""
+    view.read_only = True
+    return view
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        bind_key = replica_bind_key()
+        if bind_key is not None and not self._flushing:
+            return self.db.get_engine(self.app, bind=bind_key)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def replica_bind_key():
+    if not has_request_context():
+        return None
+    return g.get('db_replica')
+
+
+def may_be_stale():
+    """True if this request reads from a replica that may not have caught
+    up with a write this process committed. Used to keep such pages out of
+    the page cache."""
+    if replica_bind_key() is None:
+        return False
+    return time.monotonic() - _last_write < current_app.config['REPLICA_STICKY_SECONDS']
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _mark_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(orm.Session, 'after_commit')
+def _record_write(db_session):
+    global _last_write
+    if not db_session.info.pop('wrote', False):
+        return
+    with _last_write_lock:
+        _last_write = time.monotonic()
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(orm.Session, 'after_soft_rollback')
+def _forget_write(db_session, previous_transaction):
+    db_session.info.pop('wrote', None)
+
+
+def init_app(app):
+    replicas = app.config['SQLALCHEMY_REPLICAS']
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    bind_keys = []
+    for number, url in enumerate(replicas, 1):
+        bind_keys.append('replica{}'.format(number))
+        binds[bind_keys[-1]] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+    if not bind_keys:
+        return
+
+    @app.before_request
+    def choose_replica():
+        view = app.view_functions.get(request.endpoint)
+        readable = request.method in ('GET', 'HEAD') or getattr(view, 'read_only', False)
+        if readable and session.get(STICKY_KEY, 0) <= time.time():
+            g.db_replica = random.choice(bind_keys)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.pop('db_wrote', False):
+            session[STICKY_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
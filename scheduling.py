@@ -0,0 +1,131 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import func, or_, select
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Scheduling.
+#----------------------------------------------------------------------------#
+# A show books its venue and its artist for [start_time, start_time +
+# duration_minutes). Postgres keeps that range in shows.slot and two GiST
+# exclusion constraints reject overlapping bookings, so conflict and
+# free-slot lookups are index range scans however much history a venue
+# has. Calendar does the same check in memory for batches (import, seed)
+# before they reach the database. Shows of soft-deleted venues and artists
+# are ignored. deletes.soft_delete removes their unfinished shows at once,
+# so only past slots stay held by the constraints until deletes.purge runs.
+
+
+def slot_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+def live_shows(*columns):
+    """select(*columns) from shows whose venue and artist aren't deleted."""
+    return select(*columns).select_from(Show).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ).where(Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+
+
+class Calendar:
+    """One venue's or artist's bookings as sorted, non-overlapping
+    [start, end) intervals; conflict() is a bisect, O(log n)."""
+
+    def __init__(self, bookings=()):
+        self.starts = []
+        self.ends = []
+        for start, end in bookings:
+            self.add(start, end)
+
+    def conflict(self, start, end):
+        """The booking overlapping [start, end), or None."""
+        index = bisect_right(self.starts, start)
+        # Bookings don't overlap, so ends are sorted too: only the
+        # neighbours on either side of start can clash.
+        if index and self.ends[index - 1] > start:
+            return self.starts[index - 1], self.ends[index - 1]
+        if index < len(self.starts) and self.starts[index] < end:
+            return self.starts[index], self.ends[index]
+        return None
+
+    def add(self, start, end):
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
+class Calendars:
+    """Calendars per venue and artist, loaded from the database on first
+    use and updated with every booking that passes check()."""
+
+    def __init__(self):
+        self.calendars = {}
+
+    def load(self, column, owner_ids):
+        """Load the calendars of owner_ids not loaded yet, in one query."""
+        missing = {owner_id for owner_id in owner_ids
+                   if (column.key, owner_id) not in self.calendars}
+        if not missing:
+            return
+        bookings = defaultdict(list)
+        for owner_id, start, duration in db.session.execute(
+                live_shows(column, Show.start_time, Show.duration_minutes)
+                .where(column.in_(missing)).order_by(Show.start_time)):
+            bookings[owner_id].append((start, slot_end(start, duration)))
+        for owner_id in missing:
+            self.calendars[column.key, owner_id] = Calendar(bookings[owner_id])
+
+    def calendar(self, column, owner_id):
+        self.load(column, [owner_id])
+        return self.calendars[column.key, owner_id]
+
+    def book(self, venue_id, artist_id, start_time, duration_minutes):
+        """Record the show, or raise ValueError if either side is taken."""
+        end = slot_end(start_time, duration_minutes)
+        venue = self.calendar(Show.venue_id, venue_id)
+        artist = self.calendar(Show.artist_id, artist_id)
+        for label, owner_id, calendar in (('venue', venue_id, venue), ('artist', artist_id, artist)):
+            clash = calendar.conflict(start_time, end)
+            if clash is not None:
+                raise ValueError('{} {} is booked from {:%Y-%m-%d %H:%M} to {:%H:%M}'.format(
+                    label, owner_id, *clash))
+        venue.add(start_time, end)
+        artist.add(start_time, end)
+
+
+def overlapping(start_time, end):
+    return Show.slot.op('&&')(func.tsrange(start_time, end, '[)'))
+
+
+def conflicting_show(venue_id, artist_id, start_time, duration_minutes):
+    """A show booking the venue or the artist during the new show, or None."""
+    end = slot_end(start_time, duration_minutes)
+    return db.session.execute(
+        live_shows(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                   func.upper(Show.slot).label('end_time'))
+        .where(or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+               overlapping(start_time, end))
+        .order_by(Show.start_time).limit(1)
+    ).first()
+
+
+def free_slots(venue_id, start_time, end_time, min_minutes=0):
+    """[start, end) gaps between a venue's bookings within the range that
+    are at least min_minutes long."""
+    busy = db.session.execute(
+        live_shows(Show.start_time, func.upper(Show.slot))
+        .where(Show.venue_id == venue_id, overlapping(start_time, end_time))
+        .order_by(Show.start_time))
+    minimum = timedelta(minutes=min_minutes)
+    slots = []
+    cursor = start_time
+    for busy_start, busy_end in busy:
+        if busy_start - cursor >= minimum and busy_start > cursor:
+            slots.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if end_time - cursor >= minimum and end_time > cursor:
+        slots.append((cursor, end_time))
+    return slots
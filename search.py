@@ -0,0 +1,207 @@
+import re
+from collections import defaultdict
+from flask import current_app, has_app_context
+from sqlalchemy import event, exists, func, literal, or_, select, union_all
+from sqlalchemy.sql import operators
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Search backends.
+#----------------------------------------------------------------------------#
+# Both backends answer search(model, term, limit, offset) with
+# (total_matches, [ids in rank order]); the views load the page rows.
+
+SEARCHABLE_MODELS = (Venue, Artist)
+
+# Made once: SQLAlchemy can't cache statements that use an operator made by
+# .op() on each call, so every search would be compiled anew.
+MATCHES = operators.custom_op('@@')
+WORD_SIMILAR = operators.custom_op('<%')
+
+
+def escape_like(term):
+    return re.sub(r'([\\%_])', r'\\\1', term)
+
+
+class PostgresSearch:
+    """Ranks full-text matches on search_vector together with trigram
+    similarity on search_text. Both columns are maintained by a trigger
+    (see migration b7d21f4c9a13) and indexed with GIN.
+
+    Rows match on whole words or a substring; only when none do are
+    similar spellings (pg_trgm word similarity) matched instead. At most
+    SEARCH_MAX_MATCHES of them are ranked, so a broad term such as a genre
+    costs the same as a narrow one; the total is then a lower bound. The
+    matches are MATERIALIZED because under that LIMIT the planner prefers
+    a sequential scan, which runs the match on every row.
+    """
+
+    def search(self, model, term, limit, offset):
+        term = term.strip()
+        if not term:
+            return 0, []
+        query = func.plainto_tsquery('simple', term)
+        columns = (model.id, model.search_vector, model.search_text)
+        exact = select(*columns).where(or_(
+            model.search_vector.operate(MATCHES, query),
+            model.search_text.ilike('%{}%'.format(escape_like(term)))
+        ), model.deleted_at.is_(None)).cte('exact').prefix_with('MATERIALIZED')
+        similar = select(*columns).where(
+            literal(term).operate(WORD_SIMILAR, model.search_text), model.deleted_at.is_(None)
+        ).cte('similar').prefix_with('MATERIALIZED')
+        matches = union_all(
+            select(exact),
+            select(similar).where(~exists(select(exact.c.id)))
+        ).limit(current_app.config['SEARCH_MAX_MATCHES']).subquery('matches')
+        rank = (func.ts_rank_cd(matches.c.search_vector, query)
+                + func.word_similarity(literal(term), matches.c.search_text))
+        rows = db.session.execute(select(
+            matches.c.id, func.count().over().label('total')
+        ).order_by(rank.desc(), matches.c.id).limit(limit).offset(offset)).all()
+        if not rows:
+            return 0, []
+        return rows[0].total, [row.id for row in rows]
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class InvertedIndex:
+    """In-process trigram index over the same fields as search_text.
+
+    Candidates share a trigram with the query; they match when every query
+    token is a substring of some document token, and rank by how many
+    trigrams they share with the query.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.documents = {}
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        tokens = tokenize(text)
+        self.documents[doc_id] = tokens
+        for token in tokens:
+            for gram in trigrams(token):
+                self.postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        tokens = self.documents.pop(doc_id, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            for gram in trigrams(token):
+                self.postings[gram].discard(doc_id)
+
+    def search(self, term, limit, offset):
+        query_tokens = tokenize(term)
+        if not query_tokens:
+            return 0, []
+        scores = defaultdict(int)
+        for token in query_tokens:
+            for gram in trigrams(token):
+                for doc_id in self.postings.get(gram, ()):
+                    scores[doc_id] += 1
+        if all(len(token) < 3 for token in query_tokens):
+            # Too short to have a trigram, so every document is a candidate.
+            scores = dict.fromkeys(self.documents, 0)
+        matches = [
+            doc_id for doc_id in scores
+            if all(any(query in token for token in self.documents[doc_id])
+                   for query in query_tokens)
+        ]
+        matches.sort(key=lambda doc_id: (-scores[doc_id], doc_id))
+        return len(matches), matches[offset:offset + limit]
+
+
+def search_text(entity):
+    return ' '.join([entity.name, entity.city, entity.state] + list(entity.genres or []))
+
+
+class MemorySearch:
+    """Fallback backend for tests and databases without pg_trgm.
+
+    Each model's index is built from the table on first use and then kept
+    current by the mapper events below.
+    """
+
+    def __init__(self):
+        self.indexes = {}
+
+    def index(self, model):
+        if model not in self.indexes:
+            index = InvertedIndex()
+            for entity in db.session.query(
+                    model.id, model.name, model.city, model.state, model.genres):
+                index.add(entity.id, search_text(entity))
+            self.indexes[model] = index
+        return self.indexes[model]
+
+    def update(self, entity):
+        if type(entity) not in self.indexes:
+            return
+        if entity.deleted_at is not None:
+            self.indexes[type(entity)].remove(entity.id)
+        else:
+            self.indexes[type(entity)].add(entity.id, search_text(entity))
+
+    def remove(self, entity):
+        if type(entity) in self.indexes:
+            self.indexes[type(entity)].remove(entity.id)
+
+    def search(self, model, term, limit, offset):
+        return self.index(model).search(term, limit, offset)
+
+
+# Registered once for every app; each write goes to the index of the app
+# that made it, if that app searches in memory.
+
+def memory_search():
+    backend = current_app.extensions.get('search') if has_app_context() else None
+    return backend if isinstance(backend, MemorySearch) else None
+
+
+def _index_entity(mapper, connection, target):
+    backend = memory_search()
+    if backend is not None:
+        backend.update(target)
+
+
+def _unindex_entity(mapper, connection, target):
+    backend = memory_search()
+    if backend is not None:
+        backend.remove(target)
+
+
+for model in SEARCHABLE_MODELS:
+    event.listen(model, 'after_insert', _index_entity)
+    event.listen(model, 'after_update', _index_entity)
+    event.listen(model, 'after_delete', _unindex_entity)
+
+
+def forget(model):
+    """Rebuild model's in-memory index on next use; for Core writes, which
+    the mapper events never see."""
+    backend = memory_search()
+    if backend is not None:
+        backend.indexes.pop(model, None)
+
+
+BACKENDS = {
+    'postgres': PostgresSearch,
+    'memory': MemorySearch,
+}
+
+
+def init_app(app):
+    app.extensions['search'] = BACKENDS[app.config['SEARCH_BACKEND']]()
+
+
+def search(model, term, limit, offset=0):
+    return current_app.extensions['search'].search(model, term, limit, offset)
@@ -0,0 +1,190 @@
+import random
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from enums import Genre, State
+from models import db, Venue, Artist, Show
+import counters
+import feed
+import scheduling
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+# Generates venues, artists and shows at realistic proportions for load
+# testing: entities cluster in populous states and their big cities, genres
+# follow a popularity curve, and a few artists and venues host most shows.
+
+# Relative weights for the states the generator favours; the rest get 1.
+STATE_WEIGHTS = {
+    'CA': 12, 'TX': 9, 'FL': 7, 'NY': 6, 'PA': 4, 'IL': 4, 'OH': 3,
+    'GA': 3, 'NC': 3, 'MI': 3, 'NJ': 3, 'VA': 3, 'WA': 3, 'AZ': 2,
+    'MA': 2, 'TN': 2, 'MD': 2, 'CO': 2, 'MN': 2, 'MO': 2, 'WI': 2,
+}
+
+CITIES = {
+    'CA': ['Los Angeles', 'San Francisco', 'San Diego', 'Oakland', 'Sacramento'],
+    'TX': ['Austin', 'Houston', 'Dallas', 'San Antonio'],
+    'FL': ['Miami', 'Orlando', 'Tampa', 'Jacksonville'],
+    'NY': ['New York', 'Brooklyn', 'Buffalo', 'Rochester'],
+    'PA': ['Philadelphia', 'Pittsburgh'],
+    'IL': ['Chicago', 'Springfield'],
+    'OH': ['Columbus', 'Cleveland', 'Cincinnati'],
+    'GA': ['Atlanta', 'Savannah'],
+    'NC': ['Charlotte', 'Raleigh', 'Asheville'],
+    'MI': ['Detroit', 'Grand Rapids'],
+    'TN': ['Nashville', 'Memphis'],
+    'WA': ['Seattle', 'Spokane'],
+    'CO': ['Denver', 'Boulder'],
+    'LA': ['New Orleans', 'Baton Rouge'],
+    'MA': ['Boston', 'Cambridge'],
+}
+
+GENRE_WEIGHTS = {
+    'Rock_n_Roll': 10, 'Pop': 9, 'Hip_Hop': 8, 'Alternative': 7, 'Jazz': 6,
+    'Electronic': 6, 'Country': 5, 'RB': 5, 'Blues': 4,
+    'Folk': 4, 'Soul': 4, 'Punk': 3, 'Heavy_Metal': 3, 'Reggae': 3,
+    'Funk': 3, 'Classical': 2, 'Instrumental': 2, 'Musical_Theatre': 1,
+}
+
+ADJECTIVES = ['Golden', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Crimson',
+              'Lucky', 'Wild', 'Blue', 'Neon', 'Rusty', 'Hollow', 'Broken', 'Royal']
+NOUNS = ['Owl', 'Lantern', 'Room', 'Garden', 'Tiger', 'Harbor', 'Anchor',
+         'Ballroom', 'Cellar', 'Echo', 'Fox', 'Mirror', 'Canyon', 'Parlor']
+VENUE_KINDS = ['Hall', 'Club', 'Lounge', 'Theater', 'Bar', 'Stage', 'Tavern']
+ARTIST_KINDS = ['Band', 'Collective', 'Trio', 'Quartet', 'Project', 'Sound', 'Orchestra']
+
+
+class Generator:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.states = [state.name for state in State]
+        self.state_weights = [STATE_WEIGHTS.get(state, 1) for state in self.states]
+        self.genres = [genre.name for genre in Genre]
+        self.genre_weights = [GENRE_WEIGHTS.get(genre, 1) for genre in self.genres]
+
+    def place(self):
+        state = self.random.choices(self.states, self.state_weights)[0]
+        cities = CITIES.get(state) or ['{} City'.format(state)]
+        # Earlier cities in each list are the bigger ones.
+        city = self.random.choices(cities, range(len(cities), 0, -1))[0]
+        return city, state
+
+    def genre_list(self):
+        count = self.random.choices([1, 2, 3], [5, 3, 1])[0]
+        return sorted(set(self.random.choices(self.genres, self.genre_weights, k=count)))
+
+    def name(self, kinds, index):
+        return 'The {} {} {} {}'.format(
+            self.random.choice(ADJECTIVES), self.random.choice(NOUNS),
+            self.random.choice(kinds), index)
+
+    def phone(self):
+        return '{}-{}-{}'.format(self.random.randint(200, 999),
+                                 self.random.randint(200, 999),
+                                 self.random.randint(1000, 9999))
+
+    def venue(self, index):
+        city, state = self.place()
+        return {
+            'name': self.name(VENUE_KINDS, index),
+            'city': city,
+            'state': state,
+            'address': '{} Main Street'.format(self.random.randint(1, 9999)),
+            'phone': self.phone(),
+            'genres': self.genre_list(),
+            'image_link': 'https://picsum.photos/seed/venue{}/400/300'.format(index),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(index),
+            'website_link': 'https://venue{}.example.com'.format(index),
+            'seeking_talent': self.random.random() < 0.3,
+            'seeking_description': '',
+        }
+
+    def artist(self, index):
+        city, state = self.place()
+        return {
+            'name': self.name(ARTIST_KINDS, index),
+            'city': city,
+            'state': state,
+            'phone': self.phone(),
+            'genres': self.genre_list(),
+            'image_link': 'https://picsum.photos/seed/artist{}/300/300'.format(index),
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(index),
+            'website_link': 'https://artist{}.example.com'.format(index),
+            'seeking_venue': self.random.random() < 0.4,
+            'seeking_description': '',
+        }
+
+    def skewed(self, ids):
+        # Pareto-distributed pick: a few ids get most of the shows.
+        index = int(self.random.paretovariate(1.2)) - 1
+        return ids[index % len(ids)]
+
+    def show(self, venue_ids, artist_ids, now):
+        # Two thirds of the shows are in the past two years, the rest ahead.
+        start_time = (now + timedelta(days=self.random.randint(-730, 365))).replace(
+            hour=self.random.choice([18, 19, 20, 21, 22]), minute=0, second=0, microsecond=0)
+        return {
+            'venue_id': self.skewed(venue_ids),
+            'artist_id': self.skewed(artist_ids),
+            'start_time': start_time,
+            'duration_minutes': self.random.choice([60, 90, 120, 180]),
+            'upcoming': start_time > now,
+        }
+
+    def shows(self, count, venue_ids, artist_ids, now, calendars, attempts=5):
+        # Busy venues fill up, so a show that double-books is redrawn a
+        # few times and then dropped.
+        shows = []
+        for _ in range(count):
+            for _ in range(attempts):
+                show = self.show(venue_ids, artist_ids, now)
+                try:
+                    calendars.book(show['venue_id'], show['artist_id'],
+                                   show['start_time'], show['duration_minutes'])
+                except ValueError:
+                    continue
+                shows.append(show)
+                break
+        return shows
+
+
+def insert_rows(model, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+        db.session.commit()
+
+
+@click.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=20000, show_default=True)
+@click.option('--seed', 'random_seed', default=0, show_default=True,
+              help='Random seed, so runs are reproducible.')
+@click.option('--batch-size', default=5000, show_default=True)
+@with_appcontext
+def seed_command(venues, artists, shows, random_seed, batch_size):
+    """Insert synthetic venues, artists and shows."""
+    generator = Generator(random_seed)
+    venue_offset = db.session.query(db.func.count(Venue.id)).scalar()
+    artist_offset = db.session.query(db.func.count(Artist.id)).scalar()
+    insert_rows(Venue, [generator.venue(venue_offset + i) for i in range(venues)], batch_size)
+    insert_rows(Artist, [generator.artist(artist_offset + i) for i in range(artists)], batch_size)
+
+    # Shuffled so the heavily booked ids are spread over the whole table.
+    venue_ids = [venue_id for (venue_id,) in db.session.query(Venue.id)]
+    artist_ids = [artist_id for (artist_id,) in db.session.query(Artist.id)]
+    generator.random.shuffle(venue_ids)
+    generator.random.shuffle(artist_ids)
+    inserted_shows = 0
+    if shows and venue_ids and artist_ids:
+        now = datetime.now()
+        calendars = scheduling.Calendars()
+        for start in range(0, shows, batch_size):
+            rows = generator.shows(min(batch_size, shows - start), venue_ids, artist_ids,
+                                   now, calendars)
+            insert_rows(Show, rows, batch_size)
+            inserted_shows += len(rows)
+    counters.refresh_show_counts()
+    feed.refresh()
+    click.echo('Seeded {} venues, {} artists and {} shows.'.format(venues, artists, inserted_shows))
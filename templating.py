@@ -0,0 +1,53 @@
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template compilation.
+#----------------------------------------------------------------------------#
+# Compiled templates are written to TEMPLATE_CACHE_DIR, so a new worker
+# loads bytecode instead of parsing and compiling Jinja source. Run
+# "flask templates compile" at build time to fill the cache, and preload()
+# from the server's worker-start hook (see gunicorn.conf.py) so the first
+# requests don't pay for it.
+
+
+def template_names(app):
+    return app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+
+
+def preload(app):
+    """Load every template into the environment's cache; returns the count."""
+    names = template_names(app)
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+templates_cli = AppGroup('templates', help='Precompile templates.')
+
+
+@templates_cli.command('compile')
+@click.option('--clear', is_flag=True, help='Drop the existing bytecode first.')
+def compile_command(clear):
+    """Compile every template into TEMPLATE_CACHE_DIR."""
+    bytecode_cache = current_app.jinja_env.bytecode_cache
+    if bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+    if clear:
+        bytecode_cache.clear()
+    started = time.perf_counter()
+    count = preload(current_app)
+    click.echo('Compiled {} templates in {:.2f}s into {}.'.format(
+        count, time.perf_counter() - started, current_app.config['TEMPLATE_CACHE_DIR']))
+
+
+def init_app(app):
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.cli.add_command(templates_cli)
@@ -0,0 +1,143 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+from app import create_app
+from models import db, Venue, Artist, Show
+import feed
+
+#----------------------------------------------------------------------------#
+# Test setup.
+#----------------------------------------------------------------------------#
+# Database tests run against TEST_DATABASE_URL, a scratch Postgres database
+# (with the pg_trgm, btree_gist, cube and earthdistance extensions
+# available) whose public schema is dropped and rebuilt with the
+# migrations at the start of the run:
+#
+#     TEST_DATABASE_URL=postgresql://postgres@localhost/fyyur_test python -m pytest
+#
+# Without it they are skipped and only the in-memory tests run.
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+TABLES = ('shows', '"Venue"', '"Artist"', 'jobs', 'job_schedules')
+
+
+def make_app(**settings):
+    """An app on the test database, with config.py's settings overridden."""
+    values = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    values.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        SQLALCHEMY_DATABASE_URI=TEST_DATABASE_URL or 'postgresql://localhost/fyyur_test',
+        SQLALCHEMY_REPLICAS=[],
+        # Tests refresh the feed themselves rather than through jobs.
+        FEED_REFRESH_DELAY=None,
+        TEMPLATE_CACHE_DIR=None,
+        ERROR_LOG='',
+    )
+    values.update(settings)
+    return create_app(SimpleNamespace(**values))
+
+
+@pytest.fixture(scope='session')
+def app():
+    return make_app()
+
+
+@pytest.fixture(scope='session')
+def database(app):
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from flask_migrate import Migrate, stamp, upgrade
+    Migrate(app, db, directory=os.path.join(ROOT, 'migrations'))
+    with app.app_context():
+        db.session.execute(text('DROP SCHEMA public CASCADE'))
+        db.session.execute(text('CREATE SCHEMA public'))
+        db.session.commit()
+        db.session.remove()
+        # The revisions before 0272f063b10d each recreate the tables of
+        # the one before; 0272f063b10d builds the current ones from scratch.
+        stamp(revision='e9b15c72cb38')
+        upgrade()
+    return db
+
+
+@pytest.fixture
+def clean_db(app, database):
+    """Empty tables, feed and page cache after the test."""
+    yield database
+    with app.app_context():
+        db.session.remove()
+        db.session.execute(text('TRUNCATE {} RESTART IDENTITY CASCADE'.format(', '.join(TABLES))))
+        db.session.commit()
+        feed.refresh(concurrently=False)
+    app.extensions['page_cache'].clear()
+
+
+@pytest.fixture
+def client(app, clean_db):
+    return app.test_client()
+
+
+class Factory:
+    """Adds rows through the ORM, so counter and search events run, each
+    in its own app context and commit. Returns their ids."""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+
+    def add(self, entity):
+        with self.app.app_context():
+            db.session.add(entity)
+            db.session.commit()
+            return entity.id
+
+    def venue(self, **fields):
+        self.count += 1
+        return self.add(Venue(**dict({
+            'name': 'The Blue Room {}'.format(self.count),
+            'city': 'San Francisco',
+            'state': 'CA',
+            'address': '{} Valencia Street'.format(self.count),
+            'phone': '415-555-0100',
+            'genres': ['Jazz'],
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(self.count),
+            'seeking_talent': False,
+        }, **fields)))
+
+    def artist(self, **fields):
+        self.count += 1
+        return self.add(Artist(**dict({
+            'name': 'The Night Owls {}'.format(self.count),
+            'city': 'San Francisco',
+            'state': 'CA',
+            'phone': '415-555-0199',
+            'genres': ['Jazz'],
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(self.count),
+            'seeking_venue': False,
+        }, **fields)))
+
+    def show(self, venue_id, artist_id, days=1, **fields):
+        """A show days from now (negative for a past show) at 20:00."""
+        start_time = (datetime.now() + timedelta(days=days)).replace(
+            hour=20, minute=0, second=0, microsecond=0)
+        return self.add(Show(**dict({
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'duration_minutes': 120,
+        }, **fields)))
+
+
+@pytest.fixture
+def make(app, clean_db):
+    return Factory(app)
@@ -0,0 +1,88 @@
+"""Per-route latency benchmarks over seeded data, with pytest-benchmark.
+
+    python -m pytest tests/test_benchmarks.py --benchmark-autosave
+    python -m pytest tests/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:20%
+
+The first run stores a baseline under .benchmarks/; the second fails if a
+route's median grew by more than 20% since. The api-vs-html groups time
+an HTML page against the /api/v1 request for the same rows and record
+both body sizes in extra_info. Query counts are held by
+test_routes.py, and loadtest.py measures p50/p99 over HTTP against a
+running server.
+"""
+
+import pytest
+pytest.importorskip('pytest_benchmark')
+from sqlalchemy import text
+from models import db
+import search
+import seed
+from conftest import TABLES
+
+VENUES, ARTISTS, SHOWS = 500, 1000, 10000
+
+
+@pytest.fixture(scope='module')
+def seeded(app, database):
+    result = app.test_cli_runner().invoke(args=[
+        'seed', '--venues', str(VENUES), '--artists', str(ARTISTS), '--shows', str(SHOWS)])
+    assert result.exit_code == 0, result.output
+    yield
+    with app.app_context():
+        db.session.execute(text('TRUNCATE {} RESTART IDENTITY CASCADE'.format(', '.join(TABLES))))
+        db.session.commit()
+
+
+def uncached(app, client, method, url, **kwargs):
+    """Time the full request, not the page cache."""
+    def request():
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code == 200
+    return dict(target=request, setup=app.extensions['page_cache'].clear, rounds=30)
+
+
+@pytest.mark.parametrize('method, url, data', [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('GET', '/venues?genre=Jazz&state=CA', None),
+    ('GET', '/venues/1', None),
+    ('GET', '/artists', None),
+    ('GET', '/artists/1', None),
+    ('GET', '/shows', None),
+    ('GET', '/shows/upcoming', None),
+    ('GET', '/api/v1/shows?limit=200', None),
+    ('POST', '/venues/search', {'search_term': 'golden harbor'}),
+    ('POST', '/artists/search', {'search_term': 'jazz'}),
+])
+def test_route(benchmark, app, seeded, method, url, data):
+    benchmark.pedantic(**uncached(app, app.test_client(), method, url, data=data))
+
+
+# The /shows page and artist 1's page, each with the API request for the
+# same rows; the artist's page also lists its shows.
+COUNTERPARTS = [
+    ('shows', '/shows', '/api/v1/shows?limit=60&fields=id,start_time,venue_id,venue_name,'
+                        'artist_id,artist_name,artist_image_link'),
+    ('artist', '/artists/1', '/api/v1/artists/1'),
+]
+
+
+@pytest.mark.parametrize('page, html_url, api_url', COUNTERPARTS, ids=[page for page, *urls in COUNTERPARTS])
+@pytest.mark.parametrize('side', ['html', 'api'])
+def test_api_against_html(benchmark, app, seeded, page, html_url, api_url, side):
+    client = app.test_client()
+    sizes = {name: len(client.get(url).data) for name, url in (('html', html_url), ('api', api_url))}
+    assert sizes['api'] < sizes['html']
+    benchmark.group = 'api-vs-html: ' + page
+    benchmark.extra_info.update(html_bytes=sizes['html'], api_bytes=sizes['api'])
+    benchmark.pedantic(**uncached(app, client, 'GET', html_url if side == 'html' else api_url))
+
+
+def test_memory_search_index(benchmark):
+    generator = seed.Generator(0)
+    index = search.InvertedIndex()
+    for number in range(100000):
+        venue = generator.venue(number)
+        index.add(number, ' '.join([venue['name'], venue['city'], venue['state']] + venue['genres']))
+    total, ids = benchmark(index.search, 'golden harbor', 20, 0)
+    assert total and len(ids) == 20
@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import text
+from models import db
+import instrumentation
+
+
+@pytest.mark.parametrize('url', ['/venues/{venue_id}', '/venues', '/artists', '/shows'])
+def test_not_modified(client, make, url):
+    make.artist()
+    url = url.format(venue_id=make.venue())
+    first = client.get(url)
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+    with instrumentation.assert_max_queries(1):
+        response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304 and not response.data
+    response = client.get(url, headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_write_from_another_worker_is_not_served_under_the_new_etag(app, client, make):
+    venue_id = make.venue(name='Before')
+    url = '/venues/{}'.format(venue_id)
+    first = client.get(url)
+    # Another worker's edit: its invalidation never reaches this process's
+    # cache, but the new updated_at changes the ETag.
+    with app.app_context():
+        db.session.execute(text(
+            'UPDATE "Venue" SET name = \'After\', updated_at = updated_at + interval \'1 second\' '
+            'WHERE id = :id'), {'id': venue_id})
+        db.session.commit()
+    second = client.get(url)
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert b'After' in second.data and b'Before' not in second.data
+    with instrumentation.assert_max_queries(1):
+        assert client.get(url).data == second.data
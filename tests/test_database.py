@@ -0,0 +1,19 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models import db
+from conftest import make_app
+
+
+def statement_timeout(app):
+    with app.app_context():
+        return db.session.execute(text('SHOW statement_timeout')).scalar()
+
+
+def test_apps_share_the_statement_timeout_hook(database):
+    listeners = len(Session().dispatch.after_begin)
+    first = make_app(DB_POOL_MODE='null', DB_STATEMENT_TIMEOUT_MS=1500)
+    second = make_app(DB_POOL_MODE='null', DB_STATEMENT_TIMEOUT_MS=2500)
+    assert len(Session().dispatch.after_begin) == listeners
+    # Each app's transactions get its own timeout.
+    assert statement_timeout(first) == '1500ms'
+    assert statement_timeout(second) == '2500ms'
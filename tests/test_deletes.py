@@ -0,0 +1,137 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Venue, Artist, Show
+import deletes
+import feed
+import queries
+
+NEAR = 'lat=37.7749&lng=-122.4194&miles=50'
+
+
+@pytest.fixture
+def listing(app, make):
+    """A kept and a soft-deleted venue and artist, with a show for every
+    pair but the deleted two."""
+    here = dict(latitude=37.7749, longitude=-122.4194)
+    ids = {
+        'kept_venue': make.venue(name='Kept Venue', **here),
+        'gone_venue': make.venue(name='Gone Venue', **here),
+        'kept_artist': make.artist(name='Kept Artist'),
+        'gone_artist': make.artist(name='Gone Artist'),
+    }
+    make.show(ids['kept_venue'], ids['kept_artist'], days=1)
+    make.show(ids['kept_venue'], ids['gone_artist'], days=2)
+    make.show(ids['gone_venue'], ids['kept_artist'], days=3)
+    client = app.test_client()
+    client.delete('/venues/{}/delete'.format(ids['gone_venue']))
+    client.delete('/artists/{}/delete'.format(ids['gone_artist']))
+    with app.app_context():
+        feed.refresh(concurrently=False)
+    return ids
+
+
+@pytest.mark.parametrize('url, kept', [
+    ('/', 'Kept Artist'),
+    ('/venues', 'Kept Venue'),
+    ('/venues?genre=Jazz&state=CA', 'Kept Venue'),
+    ('/venues/near?' + NEAR, 'Kept Venue'),
+    ('/venues/{kept_venue}', 'Kept Artist'),
+    ('/artists', 'Kept Artist'),
+    ('/artists?genre=Jazz', 'Kept Artist'),
+    ('/artists/{kept_artist}', 'Kept Venue'),
+    ('/shows', 'Kept Artist'),
+    ('/shows/upcoming', 'Kept Artist'),
+    ('/api/v1/venues', 'Kept Venue'),
+    ('/api/v1/artists', 'Kept Artist'),
+    ('/api/v1/shows', 'Kept Artist'),
+    ('/api/v1/venues/near?' + NEAR, 'Kept Venue'),
+])
+def test_deleted_rows_are_hidden(client, listing, url, kept):
+    response = client.get(url.format(**listing))
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert kept in page
+    assert 'Gone Venue' not in page and 'Gone Artist' not in page
+
+
+def test_deleted_rows_are_not_found(client, listing):
+    for url in ('/api/v1/venues/{gone_venue}', '/api/v1/artists/{gone_artist}'):
+        assert client.get(url.format(**listing)).status_code == 404
+
+
+def test_shared_statements_filter_without_the_session(app, listing):
+    # asgi.py runs these on its own engine, where deletes.py's session
+    # hook never sees them.
+    with app.app_context():
+        with db.engine.connect() as connection:
+            def names(stmt):
+                return [tuple(row) for row in connection.execute(stmt)]
+
+            assert names(queries.entity_page(Venue, [Venue.name])) == [('Kept Venue',)]
+            assert names(queries.entity_page(Artist, [Artist.name])) == [('Kept Artist',)]
+            assert names(queries.entity(Venue, [Venue.name], listing['gone_venue'])) == []
+            assert names(queries.shows_page([Show.id, Show.start_time, Venue.name, Artist.name]))[0][2:] == (
+                'Kept Venue', 'Kept Artist')
+            assert len(names(queries.shows_page([Show.id, Show.start_time]))) == 1
+            assert [(row.venue_id, row.artist_name) for row in connection.execute(
+                queries.upcoming_shows_by_venue([listing['kept_venue'], listing['gone_venue']], 3))] == [
+                (listing['kept_venue'], 'Kept Artist')]
+
+
+def test_async_api_hides_deleted_rows(app, listing):
+    pytest.importorskip('asyncpg')
+    import asgi
+
+    async def get(application, path):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await application({'type': 'http', 'method': 'GET', 'path': path,
+                           'query_string': b'', 'headers': []}, receive, send)
+        return messages[0]['status'], json.loads(messages[1]['body'])
+
+    async def run():
+        application = asgi.AsyncAPI(app)
+        try:
+            return [await get(application, path.format(**listing)) for path in (
+                '/api/v1/venues', '/api/v1/artists', '/api/v1/shows',
+                '/api/v1/venues/{gone_venue}')]
+        finally:
+            await application.engine.dispose()
+
+    venues, artists, shows, gone = asyncio.run(run())
+    assert [row['name'] for row in venues[1]['data']] == ['Kept Venue']
+    assert [row['name'] for row in artists[1]['data']] == ['Kept Artist']
+    assert [(row['venue_name'], row['artist_name']) for row in shows[1]['data']] == [
+        ('Kept Venue', 'Kept Artist')]
+    assert gone[0] == 404
+
+
+def test_purge(app, listing):
+    with app.app_context():
+        deletes.purge('venue', listing['gone_venue'])
+        deletes.purge('artist', listing['gone_artist'])
+        assert db.session.query(Venue.name).execution_options(include_deleted=True).all() == [
+            ('Kept Venue',)]
+        assert db.session.query(Show).count() == 1
+        kept_venue = db.session.get(Venue, listing['kept_venue'])
+        assert kept_venue.upcoming_show_count == 1
+
+
+def test_failed_delete_reports_failure(app, client, make, monkeypatch):
+    venue_id = make.venue(name='Kept Venue')
+
+    def fail(entity):
+        raise SQLAlchemyError('connection lost')
+
+    monkeypatch.setattr(deletes, 'soft_delete', fail)
+    response = client.delete('/venues/{}/delete'.format(venue_id))
+    assert response.status_code == 500 and response.get_json() == {'success': False}
+    assert client.get('/api/v1/venues/{}'.format(venue_id)).status_code == 200
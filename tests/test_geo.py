@@ -0,0 +1,21 @@
+from sqlalchemy import inspect
+from models import Venue
+from conftest import Factory, make_app
+
+SAN_FRANCISCO = dict(latitude=37.7749, longitude=-122.4194)
+NEAR = '/api/v1/venues/near?lat=37.7749&lng=-122.4194&miles=10'
+
+
+def venue_names(client):
+    return [venue['name'] for venue in client.get(NEAR).get_json()['data']]
+
+
+def test_apps_share_the_tree_events(clean_db):
+    listeners = len(inspect(Venue).dispatch.after_update)
+    first, second = make_app(GEO_BACKEND='memory'), make_app(GEO_BACKEND='memory')
+    assert len(inspect(Venue).dispatch.after_update) == listeners
+    assert venue_names(first.test_client()) == venue_names(second.test_client()) == []
+    # Each write reaches the tree of the app that made it.
+    Factory(first).venue(name='The Blue Room', **SAN_FRANCISCO)
+    assert venue_names(first.test_client()) == ['The Blue Room']
+    assert venue_names(second.test_client()) == []
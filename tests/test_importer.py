@@ -0,0 +1,58 @@
+import json
+from models import db, Venue
+from conftest import make_app
+
+VENUE = {
+    'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+    'address': '1015 Folsom Street', 'phone': '123-123-1234', 'genres': ['Jazz'],
+    'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+}
+
+
+def run_import(app, tmp_path, kind, lines):
+    path = tmp_path / '{}.jsonl'.format(kind)
+    path.write_text('\n'.join(lines) + '\n')
+    return app.test_cli_runner().invoke(args=['import', kind, str(path), '--batch-size', '2'])
+
+
+def test_incomplete_rows_are_rejected_not_fatal(app, clean_db, tmp_path):
+    missing_phone = {key: value for key, value in VENUE.items() if key != 'phone'}
+    result = run_import(app, tmp_path, 'venues', [
+        json.dumps(VENUE),
+        json.dumps(dict(VENUE, name='Null Phone', phone=None)),
+        json.dumps(dict(missing_phone, name='No Phone')),
+        json.dumps(dict(VENUE, name='No Image', image_link=None)),
+        '{"name": ',
+        '["not", "an", "object"]',
+    ])
+    assert result.exit_code == 1
+    assert ':2: phone: Invalid Phone number' in result.output
+    assert ':3: phone: Invalid Phone number' in result.output
+    assert ':5: invalid JSON' in result.output
+    assert ':6: not a JSON object' in result.output
+    assert 'Imported 2 venues, rejected 4.' in result.output
+    with app.app_context():
+        assert dict(db.session.query(Venue.name, Venue.image_link)) == {
+            'The Musical Hop': '', 'No Image': ''}
+
+
+def test_import_shows_by_name(app, make, tmp_path):
+    make.venue(name='The Musical Hop')
+    make.artist(name='Guns N Petals')
+    result = run_import(app, tmp_path, 'shows', [
+        json.dumps({'venue': 'The Musical Hop', 'artist': 'Guns N Petals',
+                    'start_time': '2035-05-21 21:30:00'}),
+        json.dumps({'venue': 'The Musical Hop', 'artist': 'Guns N Petals',
+                    'start_time': '2035-05-21 22:00:00'}),
+        json.dumps({'venue': 'Nowhere', 'artist': 'Guns N Petals', 'start_time': None}),
+    ])
+    assert 'Imported 1 shows, rejected 2.' in result.output
+    assert "venue: unknown 'Nowhere'" in result.output
+
+
+def test_import_resets_the_memory_search_index(clean_db, tmp_path):
+    app = make_app(SEARCH_BACKEND='memory')
+    client = app.test_client()
+    assert b'The Musical Hop' not in client.post('/venues/search', data={'search_term': 'musical'}).data
+    run_import(app, tmp_path, 'venues', [json.dumps(VENUE)])
+    assert b'The Musical Hop' in client.post('/venues/search', data={'search_term': 'musical'}).data
@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, text
+from models import db, Venue, Show
+import queries
+
+# Analyzed shows at a few hundred per venue and artist give the planner
+# real choices; with fewer, it reads one venue's or artist's shows through
+# the GiST index of the double-booking constraint, which also leads with
+# venue_id/artist_id, and sorts them. The tables are still small enough
+# for a sequential scan to win, so plans are taken with enable_seqscan off:
+# an index that can serve the query is then used, and one that can't
+# leaves a Seq Scan behind.
+
+VENUES, ARTISTS, SHOWS = 40, 40, 20000
+
+
+@contextmanager
+def captured_selects(app):
+    """Collect (statement, parameters) for each SELECT run in the block."""
+    selects = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            selects.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield selects
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def indexes_used(app, selects):
+    used = set()
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            for statement, parameters in selects:
+                plan = connection.exec_driver_sql(
+                    'EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+                used.update(node['Index Name'] for node in plan_nodes(plan[0]['Plan'])
+                            if 'Index Name' in node)
+    return used
+
+
+@pytest.fixture
+def listing(app, make):
+    venue_ids = [make.venue() for number in range(VENUES)]
+    artist_ids = [make.artist() for number in range(ARTISTS)]
+    # Three hours apart, so no two shows overlap.
+    first = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=SHOWS // 16)
+    with app.app_context():
+        db.session.execute(Show.__table__.insert(), [{
+            'venue_id': venue_ids[number % VENUES],
+            'artist_id': artist_ids[number * 7 % ARTISTS],
+            'start_time': first + timedelta(hours=3 * number),
+            'duration_minutes': 120,
+        } for number in range(SHOWS)])
+        db.session.commit()
+        db.session.execute(text('ANALYZE shows, "Venue", "Artist"'))
+        db.session.commit()
+    return venue_ids[0], artist_ids[0]
+
+
+@pytest.mark.parametrize('url, index', [
+    ('/venues/{venue_id}', 'ix_shows_venue_id_start_time'),
+    ('/artists/{artist_id}', 'ix_shows_artist_id_start_time'),
+    ('/api/v1/shows?venue_id={venue_id}', 'ix_shows_venue_id_start_time'),
+    ('/api/v1/shows?artist_id={artist_id}', 'ix_shows_artist_id_start_time'),
+    ('/api/v1/shows?cursor=2030-01-01T20:00:00_1', 'ix_shows_start_time_id'),
+    ('/shows?cursor=2030-01-01T20:00:00_1', 'ix_shows_start_time_id'),
+])
+def test_show_lookups_use_their_index(app, client, listing, url, index):
+    venue_id, artist_id = listing
+    with captured_selects(app) as selects:
+        assert client.get(url.format(venue_id=venue_id, artist_id=artist_id)).status_code == 200
+    assert index in indexes_used(app, selects)
+
+
+def test_venue_area_lookup_uses_city_state(app, listing):
+    with captured_selects(app) as selects:
+        with app.app_context():
+            db.session.execute(queries.venue_areas(
+                Venue.city == 'San Francisco', Venue.state == 'CA')).all()
+    assert 'ix_Venue_city_state' in indexes_used(app, selects)
+
+
+def test_search_uses_the_search_indexes(app, client, listing):
+    with app.app_context():
+        if db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar() is None:
+            pytest.skip('needs pg_trgm')
+    for url, table in (('/venues/search', 'Venue'), ('/artists/search', 'Artist')):
+        with captured_selects(app) as selects:
+            client.post(url, data={'search_term': 'blue'})
+        assert {'ix_{}_search_vector'.format(table),
+                'ix_{}_search_text_trgm'.format(table)} <= indexes_used(app, selects)
@@ -0,0 +1,25 @@
+import os
+from conftest import make_app
+
+
+def test_metrics_endpoint_is_off_by_default(client):
+    assert client.get('/_debug/metrics').status_code == 404
+
+
+def test_metrics_endpoint_wants_the_token_outside_debug(database):
+    app = make_app(DEBUG=False, METRICS_ENDPOINT=True, METRICS_TOKEN='scraper')
+    client = app.test_client()
+    assert client.get('/_debug/metrics').status_code == 404
+    assert client.get('/_debug/metrics', headers={'Authorization': 'Bearer other'}).status_code == 404
+    response = client.get('/_debug/metrics', headers={'Authorization': 'Bearer scraper'})
+    assert response.status_code == 200 and b'fyyur_requests_total' in response.data
+    tokenless = make_app(DEBUG=False, METRICS_ENDPOINT=True, METRICS_TOKEN=None).test_client()
+    assert tokenless.get('/_debug/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+
+
+def test_profiles_of_the_same_second_are_kept(database, tmp_path):
+    app = make_app(PROFILE_ENDPOINTS=['index'], PROFILE_DIR=str(tmp_path))
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/').status_code == 200
+    assert len(os.listdir(tmp_path)) == 3
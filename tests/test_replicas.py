@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from models import db
+from conftest import TEST_DATABASE_URL, make_app
+import replicas
+
+# The "replica" is the test database under a second engine, so routing can
+# be checked by which engine runs the statements.
+
+
+@pytest.fixture(scope='module')
+def replica_app(database):
+    return make_app(SQLALCHEMY_REPLICAS=[TEST_DATABASE_URL])
+
+
+@contextmanager
+def engine_statements(app):
+    """{'primary': [...], 'replica': [...]} statements run in the block."""
+    with app.app_context():
+        engines = {'primary': db.get_engine(app), 'replica': db.get_engine(app, bind='replica1')}
+    statements = {name: [] for name in engines}
+    listeners = {name: lambda conn, cursor, statement, *args, name=name: statements[name].append(statement)
+                 for name in engines}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', listeners[name])
+    try:
+        yield statements
+    finally:
+        for name, engine in engines.items():
+            event.remove(engine, 'before_cursor_execute', listeners[name])
+
+
+VENUE_FORM = {
+    'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+    'address': '1015 Folsom Street', 'phone': '123-123-1234', 'genres': ['Jazz'],
+    'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+}
+
+
+def test_reads_go_to_the_replica(replica_app, make):
+    venue_id = make.venue()
+    client = replica_app.test_client()
+    with engine_statements(replica_app) as statements:
+        assert client.get('/venues/{}'.format(venue_id)).status_code == 200
+        assert client.post('/venues/search', data={'search_term': 'blue'}).status_code == 200
+        assert client.get('/api/v1/venues').status_code == 200
+    assert statements['replica'] and not statements['primary']
+
+
+def test_writes_go_to_the_primary_and_stick(replica_app, make):
+    venue_id = make.venue()
+    client = replica_app.test_client()
+    with engine_statements(replica_app) as statements:
+        client.post('/venues/{}/edit'.format(venue_id), data=dict(VENUE_FORM, name='Renamed'))
+    assert any(statement.startswith('UPDATE') for statement in statements['primary'])
+    assert not any(statement.startswith('UPDATE') for statement in statements['replica'])
+    with client.session_transaction() as session:
+        assert replicas.STICKY_KEY in session
+
+    # The redirect after the edit reads its own write from the primary.
+    with engine_statements(replica_app) as statements:
+        assert b'Renamed' in client.get('/venues/{}'.format(venue_id)).data
+    assert statements['primary'] and not statements['replica']
+
+    # Other clients keep reading from the replica.
+    with engine_statements(replica_app) as statements:
+        replica_app.test_client().get('/venues/{}'.format(venue_id))
+    assert statements['replica'] and not statements['primary']
+
+
+def test_stale_replica_pages_are_not_cached(replica_app, make):
+    venue_id = make.venue()
+    client = replica_app.test_client()
+    client.post('/venues/{}/edit'.format(venue_id), data=dict(VENUE_FORM, name='Renamed'))
+    # Another client reads from the replica within REPLICA_STICKY_SECONDS
+    # of this process's write, so its page is not stored.
+    replica_app.test_client().get('/venues/{}'.format(venue_id))
+    assert not replica_app.extensions['page_cache'].entries
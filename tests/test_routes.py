@@ -0,0 +1,177 @@
+import threading
+import pytest
+from flask import before_render_template
+import cache
+import feed
+import instrumentation
+from conftest import make_app
+
+# Every GET route in app.py and api.py with its query budget. The budgets
+# are what the views need with data in every table; a new query per
+# request, or one per row, fails here before it reaches loadtest.py.
+ROUTES = [
+    ('/', 1),
+    ('/venues', 3),
+    ('/venues?genre=Jazz&state=CA&seeking=1', 3),
+    ('/venues/near?lat=37.7749&lng=-122.4194&miles=50', 3),
+    ('/venues/{venue_id}', 4),
+    ('/venues/create', 0),
+    ('/venues/{venue_id}/edit', 1),
+    ('/artists', 3),
+    ('/artists?genre=Jazz&genre=Blues', 3),
+    ('/artists/{artist_id}', 4),
+    ('/artists/create', 0),
+    ('/artists/{artist_id}/edit', 1),
+    ('/shows', 2),
+    ('/shows/upcoming', 1),
+    ('/shows/upcoming?state=CA&city=San+Francisco', 1),
+    ('/shows/upcoming?genre=Jazz', 1),
+    ('/shows/create', 0),
+    ('/api/v1/venues', 1),
+    ('/api/v1/venues/{venue_id}', 1),
+    ('/api/v1/artists', 1),
+    ('/api/v1/artists/{artist_id}', 1),
+    ('/api/v1/shows', 1),
+    ('/api/v1/venues/near?lat=37.7749&lng=-122.4194', 3),
+    ('/api/v1/venues/{venue_id}/free-slots?start=2030-01-01T00:00&end=2030-01-08T00:00', 2),
+]
+
+
+def add_listing(app, make, venues=3, shows_per_venue=2):
+    venue_ids, artist_ids = [], []
+    for number in range(venues):
+        venue_ids.append(make.venue(latitude=37.7749, longitude=-122.4194))
+        artist_ids.append(make.artist(genres=['Jazz', 'Blues']))
+        for day in range(1, shows_per_venue + 1):
+            make.show(venue_ids[-1], artist_ids[-1], days=day)
+            make.show(venue_ids[-1], artist_ids[-1], days=-day)
+    with app.app_context():
+        feed.refresh(concurrently=False)
+    return venue_ids, artist_ids
+
+
+@pytest.mark.parametrize('url, budget', ROUTES)
+def test_get_routes(app, client, make, url, budget):
+    venue_ids, artist_ids = add_listing(app, make)
+    url = url.format(venue_id=venue_ids[0], artist_id=artist_ids[0])
+    with instrumentation.assert_max_queries(budget):
+        response = client.get(url)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('url', [
+    '/venues/{venue_id}',
+    '/artists/{artist_id}',
+    '/venues',
+    '/shows',
+])
+def test_cached_pages_run_only_the_validator(app, client, make, url):
+    venue_ids, artist_ids = add_listing(app, make)
+    url = url.format(venue_id=venue_ids[0], artist_id=artist_ids[0])
+    first = client.get(url)
+    with instrumentation.assert_max_queries(1):
+        second = client.get(url)
+    assert second.data == first.data
+
+
+@pytest.mark.parametrize('url', [
+    '/venues/{venue_id}',
+    '/artists/{artist_id}',
+    '/venues',
+    '/artists',
+    '/shows',
+    '/shows/upcoming',
+    '/api/v1/shows',
+    '/api/v1/venues/near?lat=37.7749&lng=-122.4194',
+])
+def test_queries_do_not_grow_with_rows(app, make, url):
+    counts = []
+    for venues, shows_per_venue in ((1, 1), (6, 5)):
+        client = app.test_client()
+        venue_ids, artist_ids = add_listing(app, make, venues, shows_per_venue)
+        with instrumentation.count_queries() as statements:
+            assert client.get(url.format(venue_id=venue_ids[0], artist_id=artist_ids[0])).status_code == 200
+        counts.append(len(statements))
+        app.extensions['page_cache'].clear()
+    assert counts[0] == counts[1]
+
+
+def test_page_invalidated_while_rendering_is_not_stored(app, client, make):
+    venue_id = make.venue()
+    url = '/venues/{}'.format(venue_id)
+
+    def concurrent_write(sender, template, context, **extra):
+        cache.invalidate_venue(venue_id, artist_ids=[])
+
+    with before_render_template.connected_to(concurrent_write, app):
+        client.get(url)
+    with instrumentation.count_queries() as statements:
+        client.get(url)
+    assert len(statements) > 1
+
+
+def test_streamed_page_invalidated_while_sending_is_not_stored(app, make):
+    venue_id, artist_id = make.venue(), make.artist()
+    make.show(venue_id, artist_id)
+    streaming = make_app(STREAM_TEMPLATES=True)
+    client = streaming.test_client()
+    response = client.get('/shows')
+
+    def concurrent_write():
+        with streaming.app_context():
+            cache.invalidate_show(venue_id, artist_id)
+
+    writer = threading.Thread(target=concurrent_write)
+    writer.start()
+    writer.join()
+    response.get_data()
+    response.close()
+    with instrumentation.count_queries() as statements:
+        client.get('/shows').close()
+    assert len(statements) > 1
+
+
+def test_streamed_shows_are_measured_and_cached(app, make):
+    add_listing(app, make)
+    streaming = make_app(STREAM_TEMPLATES=True)
+    client = streaming.test_client()
+    before = dict(instrumentation.registry.values['shows'])
+    response = client.get('/shows')
+    page = response.get_data()
+    response.close()
+    assert b'artist' in page and 'Server-Timing' not in response.headers
+    after = instrumentation.registry.values['shows']
+    assert after['requests_total'] == before.get('requests_total', 0) + 1
+    # The validator and the page, the latter run while streaming.
+    assert after['db_queries_total'] == before.get('db_queries_total', 0) + 2
+    assert after['render_seconds_total'] > before.get('render_seconds_total', 0)
+    with instrumentation.assert_max_queries(1):
+        assert client.get('/shows').data == page
+
+
+def test_venue_page_splits_shows(app, client, make):
+    venue_id = make.venue()
+    make.show(venue_id, make.artist(name='Tonight Band'), days=1)
+    make.show(venue_id, make.artist(name='Last Week Band'), days=-7)
+    page = client.get('/venues/{}'.format(venue_id)).get_data(as_text=True)
+    assert page.index('Tonight Band') < page.index('Last Week Band')
+    assert '1 Upcoming Show' in page and '1 Past Show' in page
+
+
+def test_create_venue(client):
+    response = client.post('/venues/create', data={
+        'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+        'address': '1015 Folsom Street', 'phone': '123-123-1234', 'genres': ['Jazz'],
+        'facebook_link': 'https://www.facebook.com/TheMusicalHop',
+    })
+    assert b'Venue The Musical Hop was successfully listed!' in response.data
+    assert b'The Musical Hop' in client.get('/venues').data
+
+
+def test_create_show(app, client, make):
+    venue_id, artist_id = make.venue(), make.artist()
+    response = client.post('/shows/create', data={
+        'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2035-05-21 21:30:00',
+    })
+    assert response.status_code == 302
+    assert b'2035' in client.get('/venues/{}'.format(venue_id)).data
@@ -0,0 +1,122 @@
+import re
+import pytest
+from sqlalchemy import inspect
+import instrumentation
+from models import Venue
+from search import InvertedIndex, escape_like
+from conftest import Factory, make_app
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex()
+    index.add(1, 'The Musical Hop San Francisco CA Jazz Reggae')
+    index.add(2, 'Park Square Live Music & Coffee San Francisco CA Rock_n_Roll Jazz')
+    index.add(3, 'The Dueling Pianos Bar New York NY Classical')
+    return index
+
+
+def test_index_matches_substrings_of_every_token(index):
+    assert index.search('music', 10, 0) == (2, [1, 2])
+    assert index.search('music jazz', 10, 0) == (2, [1, 2])
+    assert index.search('music classical', 10, 0) == (0, [])
+    assert index.search('hop', 10, 0) == (1, [1])
+
+
+def test_index_pages(index):
+    assert index.search('francisco', 1, 0) == (2, [1])
+    assert index.search('francisco', 1, 1) == (2, [2])
+    assert index.search('francisco', 1, 2) == (2, [])
+
+
+def test_index_short_terms_scan_every_document(index):
+    assert index.search('ny', 10, 0) == (1, [3])
+    assert index.search('  ', 10, 0) == (0, [])
+
+
+def test_index_updates(index):
+    index.add(1, 'The Musical Stop Oakland CA Blues')
+    assert index.search('hop', 10, 0) == (0, [])
+    assert index.search('stop', 10, 0) == (1, [1])
+    index.remove(1)
+    index.remove(1)
+    assert index.search('musical', 10, 0) == (0, [])
+
+
+def test_escape_like():
+    assert escape_like('50%_off\\') == '50\\%\\_off\\\\'
+
+
+def result_names(response):
+    return re.findall(r'<h5>(.*?)</h5>', response.get_data(as_text=True))
+
+
+def test_search_is_ranked_and_capped(app, client, make):
+    limit = app.config['SEARCH_RESULTS_PER_PAGE']
+    for number in range(limit + 5):
+        make.venue(name='Hall {}'.format(number), city='Oakland')
+    make.venue(name='The Oakland Hall')
+    make.venue(name='Elsewhere', city='Boston', state='MA')
+    with instrumentation.assert_max_queries(2):
+        response = client.post('/venues/search', data={'search_term': 'oakland hall'})
+    page = response.get_data(as_text=True)
+    assert 'Number of search results for "oakland hall": {}'.format(limit + 6) in page
+    names = result_names(response)
+    assert len(names) == limit
+    assert names[0] == 'The Oakland Hall'
+    assert 'Elsewhere' not in names
+    rest = result_names(client.post('/venues/search', data={
+        'search_term': 'oakland hall', 'offset': limit}))
+    assert len(rest) == 6 and not set(rest) & set(names)
+
+
+def test_search_matches_similar_spellings_only_without_exact_matches(client, make):
+    make.venue(name='The Musical Hop')
+    make.venue(name='Musicians Hall')
+    assert result_names(client.post('/venues/search', data={'search_term': 'musical'})) == [
+        'The Musical Hop']
+    assert result_names(client.post('/venues/search', data={'search_term': 'musicl'})) == [
+        'The Musical Hop', 'Musicians Hall']
+
+
+def test_search_ranks_at_most_max_matches(clean_db):
+    app = make_app(SEARCH_MAX_MATCHES=3, SEARCH_RESULTS_PER_PAGE=2)
+    make = Factory(app)
+    for number in range(5):
+        make.venue(name='Hall {}'.format(number))
+    response = app.test_client().post('/venues/search', data={'search_term': 'hall'})
+    assert 'Number of search results for "hall": 3+' in response.get_data(as_text=True)
+    assert len(result_names(app.test_client().post('/venues/search', data={
+        'search_term': 'hall', 'offset': 2}))) == 1
+
+
+def test_search_artists_escapes_like_wildcards(client, make):
+    make.artist(name='100% Pure')
+    make.artist(name='Ten Out Of Ten')
+    assert result_names(client.post('/artists/search', data={'search_term': '%'})) == ['100% Pure']
+
+
+def test_memory_backend(clean_db):
+    app = make_app(SEARCH_BACKEND='memory')
+    make = Factory(app)
+    make.venue(name='The Musical Hop')
+    client = app.test_client()
+    assert result_names(client.post('/venues/search', data={'search_term': 'music'})) == [
+        'The Musical Hop']
+    # Built on first use; later writes reach it through mapper events.
+    make.venue(name='Music Box')
+    assert result_names(client.post('/venues/search', data={'search_term': 'music'})) == [
+        'The Musical Hop', 'Music Box']
+
+
+def test_apps_share_the_index_events(clean_db):
+    listeners = len(inspect(Venue).dispatch.after_insert)
+    first, second = make_app(SEARCH_BACKEND='memory'), make_app(SEARCH_BACKEND='memory')
+    assert len(inspect(Venue).dispatch.after_insert) == listeners
+    for app in (first, second):
+        app.test_client().post('/venues/search', data={'search_term': 'music'})
+    Factory(first).venue(name='Music Box')
+    # Each write reaches the index of the app that made it.
+    assert result_names(first.test_client().post('/venues/search', data={'search_term': 'music'})) == [
+        'Music Box']
+    assert result_names(second.test_client().post('/venues/search', data={'search_term': 'music'})) == []
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+import loadtest
+from conftest import ROOT
+
+# About 500 ms on one core, most of it Flask, SQLAlchemy and WTForms.
+IMPORT_BUDGET_MS = 700
+
+
+def test_import_time_within_budget():
+    modules = loadtest.import_times()
+    total = sum(ms for ms, name in modules)
+    assert total <= IMPORT_BUDGET_MS, sorted(modules, reverse=True)[:10]
+
+
+def test_servers_skip_cli_only_modules():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import sys, app; app.create_app(); print(*sorted(sys.modules))'],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    assert not {'seed', 'importer', 'flask_migrate', 'alembic'} & set(result.stdout.split())
+
+
+def test_lazy_commands_show_their_options(app):
+    result = app.test_cli_runner().invoke(args=['seed', '--help'])
+    assert result.exit_code == 0 and '--venues' in result.output
+    result = app.test_cli_runner().invoke(args=['--help'])
+    assert 'import' in result.output and 'seed' in result.output